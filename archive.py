@@ -0,0 +1,138 @@
+import gzip
+import json
+import os
+from datetime import datetime
+from functools import lru_cache
+
+from data_processing import add_record, order_test_numbers
+
+# 归档目录：按月保存压缩后的历史结果，文件名如 results-2025-02.json.gz
+DEFAULT_ARCHIVE_DIR = "archive"
+# 数据库中保留最近几个月的结果，更早的按月归档
+DEFAULT_RETENTION_MONTHS = 12
+
+
+def month_start(year, month):
+    """某月第一天零点的时间戳（与记录时间一样按本地时间计算）"""
+    return int(datetime(year, month, 1).timestamp())
+
+
+def next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def month_of(ts):
+    moment = datetime.fromtimestamp(ts)
+    return moment.year, moment.month
+
+
+def partition_file(archive_dir, year, month):
+    return os.path.join(archive_dir, f"results-{year:04d}-{month:02d}.json.gz")
+
+
+def archived_months(archive_dir=DEFAULT_ARCHIVE_DIR):
+    """已归档的月份 [(年, 月)]"""
+    if not os.path.isdir(archive_dir):
+        return []
+    months = []
+    for filename in os.listdir(archive_dir):
+        if filename.startswith("results-") and filename.endswith(".json.gz"):
+            year, month = filename[len("results-"):-len(".json.gz")].split("-")
+            months.append((int(year), int(month)))
+    return sorted(months)
+
+
+def read_partition_file(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=12)
+def _load_partition(path, mtime):
+    return read_partition_file(path)
+
+
+def load_partition(year, month, archive_dir=DEFAULT_ARCHIVE_DIR):
+    """读取一个月的归档 {炉号: {检测次数: 记录}}，最近读过的分区缓存在内存中"""
+    path = partition_file(archive_dir, year, month)
+    if not os.path.exists(path):
+        return {}
+    return _load_partition(path, os.path.getmtime(path))
+
+
+@lru_cache(maxsize=12)
+def _load_partition_history(path, mtime):
+    from history_store import ColumnarHistory  # 需要 numpy，只在查询时导入，数据处理服务不需要
+    return ColumnarHistory.from_dict(read_partition_file(path))
+
+
+def load_partition_history(year, month, archive_dir=DEFAULT_ARCHIVE_DIR):
+    """读取一个月的归档并转为按列存储（history_store.ColumnarHistory），最近读过的分区缓存在内存中
+
+    用于查询：按条件向量化筛选，比逐条比较嵌套字典快，缓存占用的内存也更小。
+    """
+    path = partition_file(archive_dir, year, month)
+    if not os.path.exists(path):
+        from history_store import ColumnarHistory
+        return ColumnarHistory(capacity=1)
+    return _load_partition_history(path, os.path.getmtime(path))
+
+
+@lru_cache(maxsize=256)
+def _partition_furnaces(path, mtime):
+    return frozenset(read_partition_file(path))
+
+
+def load_archived_furnace(furnace_number, archive_dir=DEFAULT_ARCHIVE_DIR):
+    """一个炉号在归档中的全部检测记录 {检测次数: 记录}，没有时为空字典
+
+    各分区的炉号集合在第一次查找时读取并缓存（文件修改后重新读取），之后只打开包含该炉号的分区。
+    """
+    tests = {}
+    for year, month in archived_months(archive_dir):
+        path = partition_file(archive_dir, year, month)
+        if furnace_number in _partition_furnaces(path, os.path.getmtime(path)):
+            tests.update(load_partition(year, month, archive_dir)[furnace_number])
+    return {test_number: tests[test_number] for test_number in order_test_numbers(tests)}
+
+
+def read_partition(year, month, archive_dir=DEFAULT_ARCHIVE_DIR):
+    """读取一个月的归档，不放入缓存（用于批量导出等一次性遍历）"""
+    path = partition_file(archive_dir, year, month)
+    return read_partition_file(path) if os.path.exists(path) else {}
+
+
+def archive_old_partitions(store, archive_dir=DEFAULT_ARCHIVE_DIR, retention_months=DEFAULT_RETENTION_MONTHS, now=None):
+    """把保留期之前的结果按月压缩归档并从数据库删除，返回归档的月份列表
+
+    已处理索引不删除，归档后的报告文件不会被重新读取。
+    """
+    now = now or datetime.now()
+    year, month = now.year, now.month - retention_months
+    while month < 1:
+        year, month = year - 1, month + 12
+    cutoff = month_start(year, month)
+
+    oldest = store.oldest_ts()
+    if oldest is None or oldest >= cutoff:
+        return []
+
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = []
+    year, month = month_of(oldest)
+    while month_start(year, month) < cutoff:
+        start, end = month_start(year, month), month_start(*next_month(year, month))
+        records = store.records_between(start, end)
+        if records:
+            # 与已有的同月归档合并（例如补录的旧报告）
+            data = {furnace_number: dict(tests) for furnace_number, tests in load_partition(year, month, archive_dir).items()}
+            for furnace_number, test_number, record in records:
+                add_record(data, furnace_number, test_number, record)
+            path = partition_file(archive_dir, year, month)
+            with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+            store.delete_between(start, end)
+            archived.append((year, month))
+        year, month = next_month(year, month)
+    return archived
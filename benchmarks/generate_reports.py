@@ -0,0 +1,80 @@
+"""生成模拟的光谱仪检测报告，用于基准测试
+
+文件名为 <炉号>-<检测次数>.txt，覆盖四种牌号、Q 系列检测次数和 "<" 低于检出限的数值。
+用法：python benchmarks/generate_reports.py 目标目录 --count 10000
+"""
+import argparse
+import os
+import random
+import time
+
+# 各牌号的元素含量范围（用于生成数据，不是规格）
+COMPOSITIONS = {
+    "ADC12Z": {"Si": (9.8, 11.8), "Cu": (1.7, 2.4), "Mg": (0.15, 0.3), "Fe": (0.8, 1.1), "Zn": (1.0, 1.8),
+               "Ni": (0.03, 0.08), "Mn": (0.18, 0.42), "Ti": (0.03, 0.08), "Sn": (0.01, 0.04), "Pb": (0.05, 0.12),
+               "Cr": (0.02, 0.05)},
+    "ADC12": {"Si": (9.6, 12.0), "Cu": (1.5, 3.5), "Mg": (0.1, 0.3), "Fe": (0.6, 1.3), "Zn": (0.5, 1.0),
+              "Ni": (0.02, 0.5), "Mn": (0.1, 0.5), "Ti": (0.02, 0.06), "Sn": (0.01, 0.2), "Pb": (0.02, 0.1),
+              "Cr": (0.01, 0.04)},
+    "A380": {"Si": (7.5, 9.5), "Cu": (3.0, 4.0), "Mg": (0.02, 0.1), "Fe": (0.7, 1.3), "Zn": (1.5, 3.0),
+             "Ni": (0.05, 0.4), "Mn": (0.1, 0.5), "Ti": (0.02, 0.06), "Sn": (0.02, 0.3), "Pb": (0.02, 0.1),
+             "Cr": (0.01, 0.04)},
+    "ALSi10MnMg": {"Si": (9.5, 11.2), "Cu": (0.001, 0.03), "Mg": (0.15, 0.5), "Fe": (0.1, 0.2), "Zn": (0.001, 0.07),
+                   "Ni": (0.001, 0.01), "Mn": (0.45, 0.75), "Ti": (0.01, 0.12), "Sn": (0.0005, 0.002),
+                   "Pb": (0.0005, 0.002), "Cr": (0.002, 0.01)},
+}
+# 低于检出限的阈值，小于该值时报告中写成 "<阈值"
+DETECTION_LIMIT = 0.001
+# 每个炉次的检测次数（普通检测 + Q 系列）
+TESTS_PER_FURNACE = ["01", "02", "03", "Q1"]
+
+
+def render_report(furnace_number, test_number, brand, rng):
+    """生成一份报告原文"""
+    lines = [
+        "光谱分析报告",
+        f"样品编号: {furnace_number}-{test_number}",
+        f"牌号: {brand}",
+        f"分析时间: {time.strftime('%Y-%m-%d %H:%M:%S')}",
+        "元素      含量(%)",
+    ]
+    total = 0.0
+    for element, (low, high) in COMPOSITIONS[brand].items():
+        value = rng.uniform(low, high)
+        total += value
+        if value < DETECTION_LIMIT:
+            lines.append(f"{element:<8}<{DETECTION_LIMIT}")
+        else:
+            lines.append(f"{element:<8}{value:.4f}")
+    lines.append(f"{'Al':<8}{100 - total:.4f}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_reports(folder, count, seed=0):
+    """在 folder 中生成 count 个报告文件，返回文件名列表"""
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    filenames = []
+    furnace_seq = 0
+    while len(filenames) < count:
+        furnace_seq += 1
+        line_id = (furnace_seq % 3) + 1
+        furnace_number = f"{line_id}{furnace_seq:04d}"
+        brand = rng.choice(list(COMPOSITIONS))
+        for test_number in TESTS_PER_FURNACE:
+            if len(filenames) >= count:
+                break
+            filename = f"{furnace_number}-{test_number}.txt"
+            with open(os.path.join(folder, filename), "w", encoding="utf-8") as f:
+                f.write(render_report(furnace_number, test_number, brand, rng))
+            filenames.append(filename)
+    return filenames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成模拟的光谱仪检测报告")
+    parser.add_argument("folder")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(f"已生成 {len(generate_reports(args.folder, args.count, args.seed))} 个报告到 {args.folder}")
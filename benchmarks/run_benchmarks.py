@@ -0,0 +1,225 @@
+"""数据处理流程的基准测试
+
+对生产中实际运行的入库路径计时：sync_folder（首次全量入库和之后的增量轮询）、parse_reports、
+LatestFurnaceIndex.update / snapshots、ResultStore.query 和 MainWindow.update_table（无界面的 offscreen Qt），
+结果保存为 JSON，并与上一次的结果比较，耗时增加超过阈值时标记为退化。
+用法：python benchmarks/run_benchmarks.py --sizes 1000 10000 100000
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from generate_reports import generate_reports, render_report, COMPOSITIONS  # noqa: E402
+from data_processing import (  # noqa: E402
+    sync_folder, parse_reports, clean_text, read_file_content, LatestFurnaceIndex,
+)
+from data_store import ResultStore, parse_time  # noqa: E402
+
+# 结果保存目录
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+# 耗时比上次增加超过该比例时视为退化
+REGRESSION_THRESHOLD = 0.2
+# 增量轮询时每轮新增的报告数占总数的比例（至少 10 个）
+INCREMENT_RATIO = 0.01
+
+
+def measure(func, repeat, setup=None):
+    """运行 repeat 次，返回耗时统计（秒）；setup 在每次运行前调用，不计入耗时"""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return {"min": min(timings), "median": statistics.median(timings), "repeat": repeat}
+
+
+def bench_size(size, workdir, repeat):
+    """对一种数据规模运行全部基准，返回 {基准名: 统计}"""
+    folder = os.path.join(workdir, f"reports-{size}")
+    if not os.path.isdir(folder) or len(os.listdir(folder)) != size:
+        shutil.rmtree(folder, ignore_errors=True)
+        generate_reports(folder, size)
+    db_file = os.path.join(workdir, f"results-{size}.db")
+    results = {}
+
+    def remove_db():
+        for path in glob.glob(db_file + "*"):  # 连同 -wal、-shm 文件
+            os.remove(path)
+
+    def run_first_sync():
+        store = ResultStore(db_file)
+        try:
+            sync_folder(folder, store, store.load_manifest())
+        finally:
+            store.close()
+    # 从零入库，I/O 占大头，只跑一次；保留数据库供后面的基准使用
+    remove_db()
+    results["sync_folder.first"] = measure(run_first_sync, 1)
+
+    store = ResultStore(db_file)
+    try:
+        manifest = store.load_manifest()
+        # 没有任何变化的一轮轮询（只列目录、比较清单）
+        results["sync_folder.unchanged"] = measure(lambda: sync_folder(folder, store, manifest), repeat)
+
+        # 每轮新增一批报告，模拟生产中的增量轮询
+        rng = random.Random(size)
+        state = {"seq": 0}
+
+        def add_reports():
+            for _ in range(max(10, int(size * INCREMENT_RATIO))):
+                state["seq"] += 1
+                furnace_number = f"{state['seq'] % 3 + 1}9{state['seq']:06d}"
+                with open(os.path.join(folder, f"{furnace_number}-01.txt"), "w", encoding="utf-8") as f:
+                    f.write(render_report(furnace_number, "01", rng.choice(list(COMPOSITIONS)), rng))
+        try:
+            results["sync_folder.incremental"] = measure(
+                lambda: sync_folder(folder, store, manifest), repeat, setup=add_reports)
+        finally:
+            # 删掉新增的报告，文件夹下次可以直接复用
+            for path in glob.glob(os.path.join(folder, "?9??????-01.txt")):
+                os.remove(path)
+
+        contents = [clean_text(read_file_content(path)) for path in glob.glob(os.path.join(folder, "*.txt"))]
+        results["parse_reports"] = measure(lambda: parse_reports(contents), repeat)
+
+        rows = store.query()
+        rows.reverse()  # 按入库顺序（时间正序）
+        results["latest_index"] = bench_latest_index(rows, repeat)
+        results["query"] = bench_query(store, rows, repeat)
+
+        index = LatestFurnaceIndex()
+        for furnace_number, test_number, record in rows:
+            index.update(furnace_number, test_number, record)
+        data = next(iter(index.snapshots().values()))
+    finally:
+        store.close()
+        remove_db()
+
+    results["update_table"] = bench_update_table(data, workdir, repeat)
+    return results
+
+
+def bench_latest_index(rows, repeat):
+    """LatestFurnaceIndex：全部记录依次 update（启动时建立索引），以及一条新记录入库后取快照"""
+    def build():
+        index = LatestFurnaceIndex()
+        for furnace_number, test_number, record in rows:
+            index.update(furnace_number, test_number, record)
+        return index
+
+    index = build()
+    index.snapshots()
+    furnace_number, test_number, record = rows[-1]
+
+    def update_and_snapshot():
+        index.update(furnace_number, test_number, record)
+        index.snapshots()
+
+    return {"update": measure(build, repeat), "snapshots": measure(update_and_snapshot, repeat)}
+
+
+def bench_query(store, rows, repeat):
+    """ResultStore.query：按牌号、按炉组、按时间范围（最近 10% 的时间段）以及组合条件查询"""
+    timestamps = [parse_time(record["time"]) for _, _, record in rows]
+    start_ts = timestamps[int(len(timestamps) * 0.9)]
+    end_ts = timestamps[-1] + 1
+    return {
+        "brand": measure(lambda: store.query(brand="adc12"), repeat),
+        "line": measure(lambda: store.query(line="1"), repeat),
+        "time_range": measure(lambda: store.query(start_ts=start_ts, end_ts=end_ts), repeat),
+        "combined": measure(lambda: store.query(brand="ADC12", line="2", ranges={"Fe": (0.9, None)}, limit=100),
+                            repeat),
+    }
+
+
+def bench_update_table(data, workdir, repeat):
+    """在 offscreen Qt 中对 MainWindow.update_table 计时：切换炉号（整表重建）和同一炉号刷新（差量）"""
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])  # noqa: F841
+
+    cwd = os.getcwd()
+    os.chdir(workdir)  # MainWindow 从当前目录读取快照和 JSON 文件
+    try:
+        import main_gui
+        window = main_gui.MainWindow()
+        table, brand_label = window.tables[0], window.brand_labels[0]
+        furnaces = sorted(data, key=int, reverse=True)[:2] or [""]
+
+        state = {"i": 0}
+
+        def switch_furnace():
+            state["i"] += 1
+            window.update_table(table, data, furnaces[state["i"] % len(furnaces)], brand_label)
+
+        def same_furnace():
+            window.update_table(table, data, furnaces[0], brand_label)
+
+        return {"switch": measure(switch_furnace, repeat), "refresh": measure(same_furnace, repeat)}
+    finally:
+        os.chdir(cwd)
+
+
+def compare(current, previous):
+    """与上一次的结果比较，返回退化项列表"""
+    regressions = []
+    for size, benches in current["sizes"].items():
+        for name, stats in benches.items():
+            old = previous.get("sizes", {}).get(size, {}).get(name)
+            pairs = [(name, stats, old)] if "median" in stats else [
+                (f"{name}.{sub}", sub_stats, (old or {}).get(sub)) for sub, sub_stats in stats.items()]
+            for label, new_stats, old_stats in pairs:
+                if old_stats and new_stats["median"] > old_stats["median"] * (1 + REGRESSION_THRESHOLD):
+                    regressions.append(f"{size} {label}: {old_stats['median']:.4f}s -> {new_stats['median']:.4f}s")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="数据处理流程基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workdir", default=None, help="生成报告的目录，默认使用临时目录（可复用以跳过生成）")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench-")
+    os.makedirs(workdir, exist_ok=True)
+    result = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sizes": {},
+    }
+    for size in args.sizes:
+        print(f"规模 {size} ...")
+        result["sizes"][str(size)] = bench_size(size, workdir, args.repeat)
+        for name, stats in result["sizes"][str(size)].items():
+            print(f"  {name}: {json.dumps(stats)}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    previous_files = sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")))
+    output_file = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=4)
+    print(f"结果已保存到 {output_file}")
+
+    if previous_files:
+        with open(previous_files[-1], "r", encoding="utf-8") as f:
+            regressions = compare(result, json.load(f))
+        for line in regressions:
+            print(f"⚠ 退化 {line}")
+        if regressions:
+            sys.exit(1)
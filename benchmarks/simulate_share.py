@@ -0,0 +1,106 @@
+"""模拟共享目录卡死和出错，检查超时与退避重试
+
+在临时目录中生成报告作为"共享目录"，给 share_access.ReportShare 换上会卡住或出错的读取函数：
+- 读取卡住时，fetch 应在超时后抛出 ShareTimeout，而不是一直阻塞；
+- 读取出错时，watch_folder 应按 poll_interval 的 2、4、8... 倍退避（不超过 max_backoff），
+  出错的轮次不写入任何结果，共享目录恢复后退避清零、结果正常写入。
+用法：python benchmarks/simulate_share.py，检查不通过时以非零状态退出。
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from generate_reports import generate_reports  # noqa: E402
+from data_processing import watch_folder  # noqa: E402
+from data_store import ResultStore  # noqa: E402
+from share_access import ReportShare, ShareTimeout, read_file_bytes  # noqa: E402
+
+# 模拟的超时时间和卡住的时长，单位为秒
+TIMEOUT = 0.2
+HANG = 2
+
+
+class RecordingStop(threading.Event):
+    """代替 watch_folder 的 stop_event：记录每次等待的秒数但不真正等待，等待 rounds 次后结束监视"""
+
+    def __init__(self, rounds, on_wait=None):
+        super().__init__()
+        self.rounds = rounds
+        self.on_wait = on_wait
+        self.delays = []
+
+    def wait(self, timeout=None):
+        self.delays.append(timeout)
+        if self.on_wait:
+            self.on_wait(len(self.delays))
+        return len(self.delays) >= self.rounds
+
+
+def check(condition, message):
+    print(("通过 " if condition else "失败 ") + message)
+    return condition
+
+
+def simulate_timeout(share_dir, mirror_dir):
+    """读取卡住 HANG 秒：fetch 应在 TIMEOUT 秒左右抛出 ShareTimeout"""
+    def hanging_reader(file_path):
+        time.sleep(HANG)
+        return read_file_bytes(file_path)
+
+    share = ReportShare(mirror_dir, TIMEOUT, reader=hanging_reader)
+    file_path = os.path.join(share_dir, sorted(os.listdir(share_dir))[0])
+    started = time.perf_counter()
+    try:
+        share.fetch(file_path)
+        raised = False
+    except ShareTimeout:
+        raised = True
+    elapsed = time.perf_counter() - started
+    return [
+        check(raised, "读取卡住时抛出 ShareTimeout"),
+        check(elapsed < HANG / 2, f"超时后按时返回（{elapsed:.2f}s，超时 {TIMEOUT}s）"),
+    ]
+
+
+def simulate_backoff(share_dir, mirror_dir, db_file, failures=6, poll_interval=1, max_backoff=30):
+    """前 failures 轮读取出错，之后恢复：检查每轮的等待时间和写入的结果"""
+    state = {"failing": True}
+
+    def flaky_reader(file_path):
+        if state["failing"]:
+            raise OSError("模拟的共享目录错误")
+        return read_file_bytes(file_path)
+
+    def on_wait(count):
+        state["failing"] = count < failures  # 第 failures 次等待之后共享目录恢复
+
+    store = ResultStore(db_file)
+    share = ReportShare(mirror_dir, TIMEOUT, reader=flaky_reader)
+    stop_event = RecordingStop(failures + 2, on_wait)
+    counts = []
+    watch_folder(share_dir, store, poll_interval, stop_event=stop_event, share=share, max_backoff=max_backoff,
+                 on_update=lambda updated, replaced: counts.append(len(updated)))
+    expected = [min(max_backoff, poll_interval * 2 ** n) for n in range(1, failures + 1)]
+    expected += [poll_interval, poll_interval]
+    reports = len([name for name in os.listdir(share_dir) if name.endswith(".txt")])
+    results = [
+        check(stop_event.delays == expected, f"退避等待 {stop_event.delays}，预期 {expected}"),
+        check(counts == [reports], f"恢复后一次写入全部 {reports} 条结果（各轮写入 {counts}）"),
+    ]
+    store.close()
+    return results
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as work_dir:
+        share_dir = os.path.join(work_dir, "share")
+        generate_reports(share_dir, 5)
+        results = simulate_timeout(share_dir, os.path.join(work_dir, "mirror-timeout"))
+        results += simulate_backoff(share_dir, os.path.join(work_dir, "mirror-backoff"),
+                                    os.path.join(work_dir, "data.db"))
+    sys.exit(0 if all(results) else 1)
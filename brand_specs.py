@@ -0,0 +1,57 @@
+import json
+import math
+import os
+
+# 牌号规格配置文件：每个牌号、每个元素的预警/报警区间
+SPEC_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "brand_specs.json")
+
+
+def compile_band(band):
+    """把一个区间 {"color", "gt"/"ge", "lt"/"le"} 编译为 (下限, 含下限, 上限, 含上限, 颜色)"""
+    if "ge" in band:
+        low, low_inclusive = band["ge"], True
+    else:
+        low, low_inclusive = band.get("gt", -math.inf), False
+    if "le" in band:
+        high, high_inclusive = band["le"], True
+    else:
+        high, high_inclusive = band.get("lt", math.inf), False
+    return low, low_inclusive, high, high_inclusive, band["color"]
+
+
+class BrandSpecs:
+    """预编译的牌号规格：{牌号(大写): [(元素, 区间列表)]}，每条记录一次性判定所有元素"""
+
+    def __init__(self, config):
+        self.colors = {name: tuple(rgb) for name, rgb in config.get("colors", {}).items()}
+        self.rules = {
+            brand.upper(): [(element, [compile_band(band) for band in bands]) for element, bands in spec.items()]
+            for brand, spec in config.get("brands", {}).items()
+        }
+
+    @classmethod
+    def load(cls, spec_file=SPEC_FILE):
+        """从配置文件加载，文件不存在时不做任何着色"""
+        if not os.path.exists(spec_file):
+            return cls({})
+        with open(spec_file, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def evaluate(self, brand, record):
+        """判定一条记录，返回 {元素: 颜色名}，只包含落在某个区间内的元素；按配置顺序取第一个匹配的区间"""
+        rules = self.rules.get((brand or "").upper())
+        if not rules:
+            return {}
+
+        result = {}
+        for element, bands in rules:
+            value = record.get(element) or 0  # 缺失的元素按 0 处理
+            for low, low_inclusive, high, high_inclusive, color in bands:
+                if (value >= low if low_inclusive else value > low) and (value <= high if high_inclusive else value < high):
+                    result[element] = color
+                    break
+        return result
+
+
+# 默认规格，程序启动时加载一次
+specs = BrandSpecs.load()
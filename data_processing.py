@@ -1,28 +1,63 @@
+import hashlib
 import json
+import heapq
 import os
 import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
+from derived import derived_metrics
+from line_config import lines
+from metrics import metrics
+
 # 定义需要提取的元素
 elements = ['Si', 'Cu', 'Mg', 'Fe', 'Zn', 'Ni', 'Mn', 'Ti', 'Sn', 'Pb', 'Cr', 'Al']
 
+# 同时访问共享目录的最大连接数（并发读取文件的线程数）
+MAX_SHARE_CONNECTIONS = 8
+# 使用多进程解析时，每批交给一个进程的报告数量
+PARSE_BATCH_SIZE = 200
+
 # 计算污泥指数，保留三位小数
 def calculate_sludge_index(fe, mn, cr):
     sludge_index = 1 * fe + 2 * mn + 3 * cr
     return round(sludge_index, 3)
 
+# 品牌列表（可扩展）
+brands = ["ALSi10MnMg", "ADC12Z", "ADC12", "A380"]
+
+# 预编译的正则表达式，避免每个文件、每个元素重复编译
+# 检测牌号：不区分大小写，返回第一个匹配的品牌
+BRAND_PATTERN = re.compile(r'\b(' + '|'.join(brands) + r')\b', re.IGNORECASE)
+# 预处理时去掉的牌号关键词
+CLEAN_BRAND_PATTERN = re.compile(r'(?i)ADC12Z|AlSi10MnMg')
+# 预处理时去掉的字符 "-", "+", "<"
+CLEAN_CHARS = str.maketrans('', '', '-+<')
+# 解析报告时只去掉 "-", "+"，保留 "<" 用于标记低于检出限的元素
+PARSE_CHARS = str.maketrans('', '', '-+')
+# 一次扫描提取所有元素：元素名后跟空白（可夹杂 "<"）和数值，结果与逐个元素 re.search 一致
+ELEMENT_PATTERN = re.compile(r'(' + '|'.join(elements) + r')(?=[\s<]*\s)[\s<]+([\d.][\d.<]*)')
+
+def scan_elements(content):
+    """单次扫描提取元素含量，返回 (元素含量, 低于检出限的元素集合)，每个元素取第一次出现的值"""
+    found = {}
+    below_detection = set()
+    for match in ELEMENT_PATTERN.finditer(content):
+        element = match.group(1)
+        if element in found:
+            continue
+        if '<' in match.group(0):
+            below_detection.add(element)
+        found[element] = round(float(match.group(2).replace('<', '')), 3)
+        if len(found) == len(elements):
+            break
+    # 保持与 elements 相同的顺序，表格按此顺序显示
+    return {element: found[element] for element in elements if element in found}, below_detection
+
 # 提取文件内容中的元素含量
 def extract_elements_from_content(content):
-    element_data = {}
-    # 正则表达式用于提取元素及其含量
-    for element in elements:
-        match = re.search(rf"{element}\s+([<\d.]+)", content)
-        if match:
-            value = match.group(1)
-            if value == "<":
-                element_data[element] = 0.0  # 小于某个值时设为0
-            else:
-                element_data[element] = round(float(value), 3)
+    element_data, _ = scan_elements(content)
     return element_data
 
 # 提取文件名中的炉号和检测次数
@@ -58,132 +93,439 @@ def save_data_to_json(data, output_file):
 def clean_text(content):
     """去除特殊字符和指定的关键词（不区分大小写）"""
     # 去掉 "-", "+", "<"
-    content = re.sub(r'[-+<]', '', content)
+    content = content.translate(CLEAN_CHARS)
 
     # 去掉 "ADC12Z" 和 "AlSi10MnMg"（忽略大小写）
-    content = re.sub(r'(?i)ADC12Z|AlSi10MnMg', '', content)
-
-    return content
+    return CLEAN_BRAND_PATTERN.sub('', content)
 
 # 检测牌号
 def test_brand(content):
     """检测文本中是否包含指定的品牌名称，不区分大小写，返回第一个匹配的品牌"""
-    # 品牌列表（可扩展）
-    brands = ["ALSi10MnMg", "ADC12Z", "ADC12", "A380"]
-
-    # 构造正则表达式，使用 `|` 连接多个品牌名称，并启用 `re.IGNORECASE`
-    pattern = re.compile(r'\b(' + '|'.join(brands) + r')\b', re.IGNORECASE)
-
-    # 搜索匹配项
-    match = pattern.search(content)
+    match = BRAND_PATTERN.search(content)
 
     # 如果找到匹配项，返回匹配的品牌，否则返回 None
     return match.group(1) if match else None
 
-# 读取txt主函数，遍历文件夹并处理每个文件
-def process_folder(folder_path, data_file):
-    result = load_processed_data(data_file)  # 加载已处理的数据
+def parse_report(content):
+    """解析报告原文，返回 (牌号, 元素含量, 低于检出限的元素集合)，元素含量格式与 extract_elements_from_content 相同"""
+    a_brand = test_brand(content)
+    content = CLEAN_BRAND_PATTERN.sub('', content.translate(PARSE_CHARS))
+    element_data, below_detection = scan_elements(content)
+    return a_brand, element_data, below_detection
+
+def parse_reports(contents):
+    """批量解析多个报告原文，按输入顺序返回 parse_report 的结果列表"""
+    return [parse_report(content) for content in contents]
+
+# 由解析结果生成记录字典
+def build_record(a_brand, element_data, file_time):
+    # 计算污泥指数，公式来自派生指标配置（derived_metrics.json，数据处理服务在配置修改后重新加载），没有配置时使用默认公式
+    if "污泥指数" in derived_metrics:
+        sludge_index = derived_metrics["污泥指数"].evaluate(element_data)
+    else:
+        sludge_index = calculate_sludge_index(
+            element_data.get('Fe', 0.0),
+            element_data.get('Mn', 0.0),
+            element_data.get('Cr', 0.0)
+        )
+
+    # 生成数据结构
+    return {
+        **element_data,
+        "污泥指数": sludge_index,
+        "time": file_time,
+        "牌号": a_brand
+    }
 
-    # 遍历文件夹中的所有文件
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith(".txt"):  # 假设文件是txt格式
-            file_path = os.path.join(folder_path, filename)
+# 读取报告原文和保存时间（只做 I/O，不解析）
+def fetch_report(file_path):
+    return read_file_content(file_path), get_file_creation_time(file_path)
+
+# 报告原文的内容哈希，用于判断修改时间变化的报告内容是否真的变化
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+# 同一条结果新旧记录中值不同的字段 [(字段, 旧值, 新值)]
+# 不比较 time：更正后的文件修改时间只是更正的时间，检测时间保持不变（新的修改时间保存在 sources 中）
+def changed_fields(old_record, new_record):
+    return [
+        (field, old_record.get(field), new_record.get(field))
+        for field in [*elements, "污泥指数", "牌号"]
+        if old_record.get(field) != new_record.get(field)
+    ]
+
+def read_reports(file_paths, max_workers=MAX_SHARE_CONNECTIONS, parse_processes=0, share=None):
+    """并发读取多个报告，返回与 file_paths 顺序一致的记录列表
+
+    I/O 由最多 max_workers 个线程并发完成（即同时访问共享目录的连接数）；
+    parse_processes 大于 0 时按批交给进程池解析，否则在当前进程内批量解析。
+    share 为 share_access.ReportShare 时经由它读取（带超时和本地镜像），否则直接读取文件。
+    """
+    return parse_fetched(fetch_reports(file_paths, max_workers, share), parse_processes)
+
+def fetch_reports(file_paths, max_workers=MAX_SHARE_CONNECTIONS, share=None):
+    """并发读取多个报告的原文和保存时间 [(原文, 保存时间)]，顺序与 file_paths 一致（只做 I/O，不解析）"""
+    if not file_paths:
+        return []
+
+    fetch = share.fetch if share else fetch_report
+    with metrics.stage("read_files"), ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(fetch, file_paths))  # map 保证结果顺序与输入一致
+
+def parse_fetched(fetched, parse_processes=0):
+    """解析 fetch_reports 读取的报告，返回顺序一致的记录列表"""
+    if not fetched:
+        return []
+    contents = [content for content, _ in fetched]
+
+    with metrics.stage("parse"):
+        if parse_processes > 0:
+            batches = [contents[i:i + PARSE_BATCH_SIZE] for i in range(0, len(contents), PARSE_BATCH_SIZE)]
+            with ProcessPoolExecutor(max_workers=parse_processes) as pool:
+                parsed = [report for batch in pool.map(parse_reports, batches) for report in batch]
+        else:
+            parsed = parse_reports(contents)
+
+    return [
+        build_record(a_brand, element_data, file_time)
+        for (a_brand, element_data, _), (_, file_time) in zip(parsed, fetched)
+    ]
+
+# 写入一条记录，并按规则重新排列该炉号的检测次数
+def add_record(result, furnace_number, test_number, record):
+    if furnace_number not in result:
+        result[furnace_number] = {}
+    result[furnace_number][test_number] = record
+
+    # 按排序顺序重新排列字典
+    result[furnace_number] = {key: result[furnace_number][key] for key in order_test_numbers(result[furnace_number])}
+
+# 获取并排序测试编号（data.json 中的保存顺序）
+def order_test_numbers(test_numbers):
+    return sorted(
+        [key for key in test_numbers if key.startswith('Q')] +  # 先选出所有Q开头的键
+        [key for key in test_numbers if key.isdigit()],  # 然后是所有数字键
+        key=lambda x: (x.startswith('Q'), x)  # 排序规则：Q系列优先，其他按自然顺序排序
+    )
 
+# 读取txt主函数，遍历文件夹并处理每个文件
+def process_folder(folder_path, data_file, max_workers=MAX_SHARE_CONNECTIONS, parse_processes=0):
+    with metrics.stage("json_load"):
+        result = load_processed_data(data_file)  # 加载已处理的数据
+
+    # 遍历文件夹中的所有文件，找出未处理过的文件
+    with metrics.stage("list_dir"):
+        filenames = sorted(os.listdir(folder_path))  # 排序保证合并顺序固定
+    pending = {}
+    for filename in filenames:
+        if filename.lower().endswith(".txt"):  # 假设文件是txt格式
+            metrics.incr("files_seen")
             # 提取炉号和检测次数
             furnace_number, test_number = parse_filename(filename)
 
             # 检查该炉号和检测次数是否已经处理过
-            if furnace_number in result and test_number in result[furnace_number]:
-                continue  # 如果已处理过，跳过
-
-            # 读取文件内容
-            content = read_file_content(file_path)
-            a_brand = test_brand(content)
-            # 去掉 - + <
-            content = clean_text(content)
-
-            # 提取元素数据
-            element_data = extract_elements_from_content(content)
-
-            # 计算污泥指数
-            sludge_index = calculate_sludge_index(
-                element_data.get('Fe', 0.0),
-                element_data.get('Mn', 0.0),
-                element_data.get('Cr', 0.0)
-            )
-
-            # 获取文件保存时间
-            file_time = get_file_creation_time(file_path)
-
-            # 生成数据结构
-            if furnace_number not in result:
-                result[furnace_number] = {}
-
-            # 添加测试编号到炉号字典中（确保存在）
-            if test_number not in result[furnace_number]:
-                result[furnace_number][test_number] = {
-                    **element_data,
-                    "污泥指数": sludge_index,
-                    "time": file_time,
-                    "牌号": a_brand
-                }
-
-            # 获取并排序测试编号
-            sorted_test_number = sorted(
-                [key for key in result[furnace_number].keys() if key.startswith('Q')] +  # 先选出所有Q开头的键
-                [key for key in result[furnace_number].keys() if key.isdigit()],  # 然后是所有数字键
-                key=lambda x: (x.startswith('Q'), x)  # 排序规则：Q系列优先，其他按自然顺序排序
-            )
-
-            # 按排序顺序重新排列字典
-            result[furnace_number] = {key: result[furnace_number][key] for key in sorted_test_number}
-
-    # 保存更新后的数据到JSON文件
-    save_data_to_json(result, data_file)
-
-def sotrjson():
-    # 输入文件和输出文件路径
-    input_file = "data.json"  # 确保 data.json 在脚本所在目录
-    output_files = {
-        "1": "data1.json",
-        "2": "data2.json",
-        "3": "data3.json",
-    }
+            if furnace_number in result and test_number in result[furnace_number] \
+                    or (furnace_number, test_number) in pending:
+                metrics.incr("files_skipped")
+                continue  # 如果已处理过，跳过；同一炉号和检测次数只取第一个文件
 
-    # 读取 JSON 文件
-    if not os.path.exists(input_file):
-        return
+            pending[(furnace_number, test_number)] = os.path.join(folder_path, filename)
 
-    with open(input_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    # 并发读取，按顺序合并到结果中
+    records = read_reports(list(pending.values()), max_workers, parse_processes)
+    for (furnace_number, test_number), record in zip(pending, records):
+        add_record(result, furnace_number, test_number, record)
+    metrics.incr("files_ingested", len(records))
 
+    # 保存更新后的数据到JSON文件
+    with metrics.stage("json_save"):
+        save_data_to_json(result, data_file)
+
+def list_reports(folder_path):
+    """列出文件夹中的 txt 文件 [(文件名, [大小, 修改时间])]"""
+    reports = []
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith(".txt"):
+                stat = entry.stat()
+                reports.append((entry.name, [stat.st_size, stat.st_mtime]))
+    return reports
+
+def scan_changed_files(folder_path, manifest, share=None):
+    """增量扫描文件夹，只比较文件大小和修改时间，返回新增或变化的 txt 文件 [(文件名, [大小, 修改时间])]"""
+    with metrics.stage("list_dir"):
+        reports = share.list_reports(folder_path) if share else list_reports(folder_path)
+    changed = [(filename, fingerprint) for filename, fingerprint in reports if manifest.get(filename) != fingerprint]
+    metrics.incr("files_seen", len(reports))
+    metrics.incr("files_skipped", len(reports) - len(changed))
+    return sorted(changed)  # 按文件名排序，保证合并顺序固定
+
+def sync_folder(folder_path, store, manifest, max_workers=MAX_SHARE_CONNECTIONS, share=None):
+    """执行一次增量同步，只写入新增或变化的行，返回 (本次新增或更新的 [(炉号, 检测次数, 记录)], 被更正的旧记录)
+
+    被更正的旧记录为 {(炉号, 检测次数): 更正前的记录}，只包含原来已经存在、这次值有变化的结果。
+
+    先只比较清单中的文件大小和修改时间，没有变化的文件不读取；
+    变化的文件读取后再比较内容哈希，内容相同的只更新清单和来源，内容不同的重新解析，
+    值有变化的结果才写入，被覆盖的旧值记入审计表 superseded。
+    share 为 share_access.ReportShare 时，列目录和读取文件都经由它进行（带超时和本地镜像）；
+    任何一个文件读取失败时本轮不写入任何结果，下一轮重新处理（已镜像的文件不再访问共享目录）。
+    """
+    keys = []
+    file_paths = []
+    changed = {}
+    for filename, fingerprint in scan_changed_files(folder_path, manifest, share):
+        furnace_number, test_number = parse_filename(filename)
+
+        # 清单里没有但结果中已存在：首次启用监视模式，直接记入清单，不再读取旧文件
+        if filename in manifest or not store.has(furnace_number, test_number):
+            keys.append((furnace_number, test_number))
+            file_paths.append(os.path.join(folder_path, filename))
+        else:
+            metrics.incr("files_skipped")
+        changed[filename] = fingerprint
+
+    # 积压较多时（如共享目录恢复后）并发读取
+    fetched = fetch_reports(file_paths, max_workers, share)
+    hashes = [content_hash(content) for content, _ in fetched]
+    known_hashes = store.source_hashes(keys)
+    # 内容哈希没有变化的报告（只是修改时间或大小变化）不重新解析
+    pending = [i for i, key in enumerate(keys) if known_hashes.get(key) != hashes[i]]
+    metrics.incr("files_unchanged", len(keys) - len(pending))
+    records = parse_fetched([fetched[i] for i in pending])
+    old_records = store.get_records([keys[i] for i in pending])
+
+    updated = []
+    replaced = {}
+    superseded = []
+    replaced_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for i, record in zip(pending, records):
+        key = keys[i]
+        if key in old_records:
+            # 报告被更正：只写入值有变化的结果，并保存被覆盖的旧值；检测时间保持原来的时间
+            record = {**record, "time": old_records[key].get("time")}
+            fields = changed_fields(old_records[key], record)
+            if not fields:
+                continue
+            replaced[key] = old_records[key]
+            superseded.extend((*key, replaced_at, field, old_value, new_value, known_hashes.get(key), hashes[i])
+                              for field, old_value, new_value in fields)
+        updated.append((*key, record))
+    sources = [
+        (*key, os.path.basename(file_path), *changed[os.path.basename(file_path)], digest)
+        for key, file_path, digest in zip(keys, file_paths, hashes)
+    ]
+
+    with metrics.stage("db_save"):
+        if updated:
+            store.upsert_records(updated)
+        if superseded:
+            store.save_superseded(superseded)
+        if sources:
+            store.save_sources(sources)
+        if changed:
+            store.save_manifest_entries(changed)
+            manifest.update(changed)
+    metrics.incr("files_ingested", len(updated))
+    if superseded:
+        metrics.incr("records_corrected", len({row[:2] for row in superseded}))
+        metrics.log("superseded", values=[[*row[:2], *row[3:6]] for row in superseded])
+    return updated, replaced
+
+# 每轮同步单独统计增量的计数器（界面显示最近一轮的值，累计值只写入日志和指标接口）
+CYCLE_COUNTERS = ("files_seen", "files_skipped", "files_ingested")
+
+def watch_folder(folder_path, store, poll_interval=2, on_update=None, stop_event=None,
+                 max_workers=MAX_SHARE_CONNECTIONS, on_ready=None, share=None, max_backoff=60, on_cycle=None):
+    """监视模式：定时增量轮询文件夹，只处理新增或变化的文件，有更新时回调 on_update(updated, replaced)（即 sync_folder 的返回值）
+
+    store 为 data_store.ResultStore，检测结果和已见文件清单都保存在其中；
+    第一轮同步完成后回调一次 on_ready()，每轮同步成功后（无论有没有更新）回调 on_cycle()。
+    共享目录不可用（访问出错或超时）时按指数退避重试，等待时间从 poll_interval 起逐次翻倍，最长 max_backoff 秒。
+    """
+    manifest = store.load_manifest()  # 只在启动时加载一次
+    stop_event = stop_event or threading.Event()
+    failures = 0
+
+    while True:
+        before = metrics.counter_values(CYCLE_COUNTERS)
+        try:
+            with metrics.stage("cycle"):
+                updated, replaced = sync_folder(folder_path, store, manifest, max_workers, share)
+        except OSError as e:  # 包括 share_access.ShareTimeout
+            failures += 1
+            delay = min(max_backoff, poll_interval * 2 ** failures)
+            print(f"共享目录不可用，{delay}s 后重试: {e}")
+            metrics.incr("share_errors")
+            metrics.log("share_error", error=str(e), retry_in=delay)
+            if stop_event.wait(delay):
+                return
+            continue
+        failures = 0
+        metrics.set_cycle(before)
+        if updated:
+            metrics.log("cycle", ingested=len(updated))
+        if updated and on_update:
+            on_update(updated, replaced)
+        if on_cycle:
+            on_cycle()
+        if on_ready:
+            on_ready()
+            on_ready = None
+
+        # 等待下一次轮询，stop_event 被设置时退出
+        if stop_event.wait(poll_interval):
+            return
+
+def save_json_atomic(data, output_file):
+    """先写临时文件再替换，读取方不会读到空文件或写了一半的文件"""
+    temp_file = output_file + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    os.replace(temp_file, output_file)
+
+def save_snapshot_file(snapshots, snapshot_file):
+    """把最近发布的炉组快照原子写入紧凑的 JSON 文件，供界面下次启动时快速加载
+
+    快照只含普通的字典、字符串和数字，使用 JSON 而不是 pickle：读取这个文件不会执行其中的任何代码。
+    """
+    temp_file = snapshot_file + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(snapshots, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temp_file, snapshot_file)
+
+def load_snapshot_file(snapshot_file):
+    """读取快照，文件不存在、损坏或格式不对时都当作没有快照，返回 None"""
+    try:
+        with open(snapshot_file, "r", encoding="utf-8") as f:
+            snapshots = json.load(f)
+    except (OSError, ValueError):  # ValueError 包括 JSONDecodeError 和 UnicodeDecodeError
+        return None
+    # 结构应为 {炉组号: {炉号: {检测次数: 记录}}}
+    if not isinstance(snapshots, dict) or not all(
+        isinstance(furnaces, dict) and all(isinstance(tests, dict) for tests in furnaces.values())
+        for furnaces in snapshots.values()
+    ):
+        return None
+    return snapshots
+
+def build_line_snapshots(data, config=lines):
+    """按炉组整理数据，返回 {炉组号: {炉号: {检测次数: 记录}}}，每个炉组只保留配置的最新炉次数量"""
     # 存储分类后的数据
-    sorted_data = {"1": {}, "2": {}, "3": {}}
+    sorted_data = {line_id: {} for line_id in config.ids}
 
     # 解析数据并分类
     for furnace_id, records in data.items():
-        group_id = furnace_id[0]  # 获取炉组号的第一位数字
-        if group_id in sorted_data:
+        group_id = config.line_of(furnace_id)  # 按炉号前缀确定炉组
+        if group_id is not None:
             sorted_data[group_id][furnace_id] = records
 
     # 处理每个炉组的数据
+    snapshots = {}
     for group_id, records in sorted_data.items():
-        # 只保留最新的 5 个炉次号
-        latest_furnaces = sorted(records.keys(), key=int, reverse=True)[:5]
+        # 只保留最新的若干个炉次号
+        latest_furnaces = sorted(records.keys(), key=int, reverse=True)[:config.windows[group_id]]
 
         # 生成最终数据
-        filtered_data = {furnace: records[furnace] for furnace in latest_furnaces}
-
-        # 获取目标文件路径
-        output_file = output_files[group_id]
-
-        # 清空文件（覆盖写入），确保不会保留旧数据
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump({}, f)
+        snapshots[group_id] = {furnace: records[furnace] for furnace in latest_furnaces}
+    return snapshots
+
+def save_line_snapshots(snapshots, line_ids=None, config=lines):
+    """原子写出各炉组快照到配置的输出文件（如 data1.json），line_ids 为 None 时写出全部炉组，否则只写出其中的炉组"""
+    with metrics.stage("json_save"):
+        for group_id, filtered_data in snapshots.items():
+            if line_ids is None or group_id in line_ids:
+                save_json_atomic(filtered_data, config.outputs[group_id])
+
+def sotrjson(data=None, write_files=True):
+    """按炉组整理数据并返回各炉组快照，data 为 {炉号: {检测次数: 记录}}，为 None 时读取 data.json
+
+    write_files 为 True 时同时原子写入各炉组的输出文件（可选的旁路输出）。
+    """
+    # 输入文件路径
+    input_file = "data.json"  # 确保 data.json 在脚本所在目录
 
-        # 写入最新数据
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(filtered_data, f, indent=4, ensure_ascii=False)
+    if data is None:
+        # 读取 JSON 文件
+        if not os.path.exists(input_file):
+            return {}
+
+        with open(input_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+    with metrics.stage("regroup"):
+        snapshots = build_line_snapshots(data)
+    if write_files:
+        save_line_snapshots(snapshots)
+    return snapshots
+
+class LatestFurnaceIndex:
+    """在入库时增量维护的“每个炉组最新 N 个炉次”索引，取代每次全量重新分组排序
+
+    每个炉组用一个大小不超过 N 的最小堆保存炉号，新炉号比堆顶大时替换堆顶；
+    各炉组的快照只在该炉组有更新时重建，取快照为常数时间。
+    炉组的定义（炉号前缀、显示数量）来自 line_config。
+    """
+
+    def __init__(self, config=lines):
+        self.config = config
+        self.line_windows = dict(config.windows)
+        self.heaps = {line_id: [] for line_id in self.line_windows}  # [(int(炉号), 炉号)]
+        self.records = {line_id: {} for line_id in self.line_windows}  # {炉号: {检测次数: 记录}}
+        self.views = {}  # 已生成的快照 {炉组号: {炉号: {检测次数: 记录}}}
+        self.dirty = set(self.line_windows)  # 快照需要重建的炉组
+        self.changed = set(self.line_windows)  # 上次 pop_changed 之后快照有变化的炉组
+
+    @classmethod
+    def from_store(cls, store, config=lines):
+        """启动时从数据库取各炉组最新的炉次建立索引"""
+        index = cls(config)
+        for line_id, window in index.line_windows.items():
+            prefix = config.prefixes[line_id]
+            for furnace_number in store.latest_furnaces(prefix, window, config.nested_prefixes(prefix)):
+                for test_number, record in store.get_furnace(furnace_number).items():
+                    index.update(furnace_number, test_number, record)
+        return index
+
+    def update(self, furnace_number, test_number, record):
+        """入库时更新一条记录，返回该记录是否在某个炉组的显示范围内"""
+        line_id = self.config.line_of(furnace_number)  # 按炉号前缀确定炉组
+        if line_id is None:
+            return False
+
+        heap = self.heaps[line_id]
+        records = self.records[line_id]
+        if furnace_number not in records:
+            key = (int(furnace_number), furnace_number)
+            if len(heap) < self.line_windows[line_id]:
+                heapq.heappush(heap, key)
+            elif key > heap[0]:
+                # 挤掉最旧的炉次
+                _, evicted = heapq.heapreplace(heap, key)
+                del records[evicted]
+            else:
+                return False  # 比显示范围内的炉次都旧
+
+        # add_record 每次生成新的字典，已发布给界面的快照不会被修改
+        add_record(records, furnace_number, test_number, record)
+        self.dirty.add(line_id)
+        return True
+
+    def snapshots(self):
+        """返回各炉组快照 {炉组号: {炉号: {检测次数: 记录}}}，炉号按降序排列"""
+        with metrics.stage("regroup"):
+            for line_id in self.dirty:
+                records = self.records[line_id]
+                latest_furnaces = sorted(records, key=int, reverse=True)
+                self.views[line_id] = {furnace: records[furnace] for furnace in latest_furnaces}
+            self.changed |= self.dirty
+            self.dirty.clear()
+        return {line_id: self.views[line_id] for line_id in self.line_windows}
+
+    def pop_changed(self):
+        """取出上次调用之后快照有变化的炉组号，用于只写出、只刷新这些炉组"""
+        changed, self.changed = self.changed, set()
+        return changed
 
 def load_json_data(filename):
     """加载 JSON 数据"""
@@ -0,0 +1,504 @@
+import argparse
+import sqlite3
+import threading
+from datetime import datetime
+
+from data_processing import elements, order_test_numbers, load_processed_data, save_data_to_json
+from line_config import lines
+
+# 检测结果数据库文件
+DEFAULT_DB_FILE = "data.db"
+# data.json 中的时间格式
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 记录字段与数据库列的对应关系（元素列直接使用元素名）
+RECORD_COLUMNS = elements + ["sludge_index", "time", "ts", "brand"]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS results (
+    furnace_number TEXT NOT NULL,
+    test_number TEXT NOT NULL,
+    {", ".join(f"{element} REAL" for element in elements)},
+    sludge_index REAL,
+    time TEXT,
+    ts INTEGER,
+    brand TEXT,
+    PRIMARY KEY (furnace_number, test_number)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_results_ts ON results (ts);
+CREATE INDEX IF NOT EXISTS idx_results_brand_nocase ON results (brand COLLATE NOCASE, ts);
+
+CREATE TABLE IF NOT EXISTS processed (
+    furnace_number TEXT NOT NULL,
+    test_number TEXT NOT NULL,
+    PRIMARY KEY (furnace_number, test_number)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS files (
+    filename TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL
+) WITHOUT ROWID;
+
+-- 每条结果的来源文件：文件名、大小、修改时间和内容哈希，报告被修改时据此判断内容是否真的变化
+CREATE TABLE IF NOT EXISTS sources (
+    furnace_number TEXT NOT NULL,
+    test_number TEXT NOT NULL,
+    filename TEXT,
+    size INTEGER,
+    mtime REAL,
+    sha256 TEXT,
+    PRIMARY KEY (furnace_number, test_number)
+) WITHOUT ROWID;
+
+-- 报告被更正时覆盖的旧值（审计记录），每个变化的字段一行
+CREATE TABLE IF NOT EXISTS superseded (
+    furnace_number TEXT NOT NULL,
+    test_number TEXT NOT NULL,
+    replaced_at TEXT NOT NULL,
+    field TEXT NOT NULL,
+    old_value,
+    new_value,
+    old_sha256 TEXT,
+    new_sha256 TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_superseded_furnace ON superseded (furnace_number, test_number);
+
+CREATE TABLE IF NOT EXISTS spc_stats (
+    line_id TEXT NOT NULL,
+    brand TEXT NOT NULL,
+    field TEXT NOT NULL,
+    n INTEGER,
+    mean REAL,
+    m2 REAL,
+    ewma REAL,
+    run_side INTEGER,
+    run_length INTEGER,
+    PRIMARY KEY (line_id, brand, field)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS derived_formulas (
+    metric TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    expression TEXT NOT NULL,
+    PRIMARY KEY (metric, version)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS derived_values (
+    metric TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    furnace_number TEXT NOT NULL,
+    test_number TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (metric, version, furnace_number, test_number)
+) WITHOUT ROWID;
+-- 结果被重新写入时按炉号删除旧的派生值
+CREATE INDEX IF NOT EXISTS idx_derived_values_furnace ON derived_values (furnace_number, test_number);
+
+CREATE TABLE IF NOT EXISTS derived_active (
+    metric TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# 可以按范围筛选的记录字段与数据库列的对应关系
+RANGE_COLUMNS = {**{element: element for element in elements}, "污泥指数": "sludge_index"}
+
+# 格式化时间转为时间戳，便于按时间建立索引（TIME_FORMAT 是 ISO 格式，fromisoformat 比 strptime 快得多）
+def parse_time(file_time):
+    if not file_time:
+        return None
+    return int(datetime.fromisoformat(file_time).timestamp())
+
+# 炉号前缀的范围 [prefix, upper)，前缀查询可以使用主键索引
+def prefix_range(prefix):
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+# 炉号前缀条件：在 prefix 的范围内并排除 exclude 中更长的前缀（嵌套的其他炉组，如前缀 1 与 19）
+def prefix_conditions(prefix, exclude=()):
+    conditions, params = ["furnace_number >= ? AND furnace_number < ?"], list(prefix_range(prefix))
+    for nested in exclude:
+        conditions.append("NOT (furnace_number >= ? AND furnace_number < ?)")
+        params.extend(prefix_range(nested))
+    return conditions, params
+
+# 炉组号对应的炉号条件，炉号按最长前缀归属到炉组（与 LineConfig.line_of 一致）
+def line_conditions(line, config=lines):
+    if line not in config.prefixes:
+        raise ValueError(f"未知的炉组: {line}")
+    prefix = config.prefixes[line]
+    return prefix_conditions(prefix, config.nested_prefixes(prefix))
+
+# 查询条件转为 SQL 条件和参数，条件含义见 ResultStore.query
+def query_conditions(brand=None, start_ts=None, end_ts=None, line=None, ranges=None):
+    conditions, params = [], []
+    if brand:
+        conditions.append("brand = ? COLLATE NOCASE")
+        params.append(brand)
+    if start_ts is not None:
+        conditions.append("ts >= ?")
+        params.append(start_ts)
+    if end_ts is not None:
+        conditions.append("ts < ?")
+        params.append(end_ts)
+    if line:
+        line_sql, line_params = line_conditions(line)
+        conditions.extend(line_sql)
+        params.extend(line_params)
+    for field, (low, high) in (ranges or {}).items():
+        if field not in RANGE_COLUMNS:
+            raise ValueError(f"不支持按 {field} 筛选")
+        if low is not None:
+            conditions.append(f"{RANGE_COLUMNS[field]} >= ?")
+            params.append(low)
+        if high is not None:
+            conditions.append(f"{RANGE_COLUMNS[field]} <= ?")
+            params.append(high)
+    return conditions, params
+
+# 记录字典转为数据库行
+def record_to_row(furnace_number, test_number, record):
+    file_time = record.get("time")
+    return (
+        furnace_number,
+        test_number,
+        *[record.get(element) for element in elements],
+        record.get("污泥指数"),
+        file_time,
+        parse_time(file_time),
+        record.get("牌号"),
+    )
+
+# 数据库行转为记录字典，格式与 data.json 相同（缺失的元素不输出）
+def row_to_record(row):
+    values = row[2:]
+    record = {element: value for element, value in zip(elements, values) if value is not None}
+    sludge_index, file_time, _, brand = values[len(elements):]
+    record["污泥指数"] = sludge_index
+    record["time"] = file_time
+    record["牌号"] = brand
+    return record
+
+
+class ResultStore:
+    """基于 SQLite 的检测结果存储，以 (炉号, 检测次数) 为主键，每次只写入新增的行"""
+
+    def __init__(self, db_file=DEFAULT_DB_FILE):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")  # 读写互不阻塞
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def count(self):
+        """结果总行数"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def processed_count(self):
+        """已处理的记录总数（包括已归档的记录）"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+
+    def has(self, furnace_number, test_number):
+        """该炉号和检测次数是否已经处理过（包括已归档的记录），只查询很小的已处理索引"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM processed WHERE furnace_number = ? AND test_number = ?",
+                (furnace_number, test_number),
+            ).fetchone()
+        return row is not None
+
+    def upsert_records(self, records):
+        """写入 [(炉号, 检测次数, 记录)]，已存在的行被替换"""
+        rows = [record_to_row(*item) for item in records]
+        placeholders = ", ".join("?" * (len(RECORD_COLUMNS) + 2))
+        with self.lock, self.conn:
+            self.conn.executemany(f"INSERT OR REPLACE INTO results VALUES ({placeholders})", rows)
+            self.conn.executemany("INSERT OR IGNORE INTO processed VALUES (?, ?)", [row[:2] for row in rows])
+            # 结果可能已变化，旧的派生值作废，下次补算时按各版本公式重新计算
+            self.conn.executemany("DELETE FROM derived_values WHERE furnace_number = ? AND test_number = ?",
+                                  [row[:2] for row in rows])
+
+    def get_furnace(self, furnace_number):
+        """读取一个炉号的全部检测记录，格式与 data.json 中的一项相同"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM results WHERE furnace_number = ?", (furnace_number,)
+            ).fetchall()
+        tests = {row[1]: row_to_record(row) for row in rows}
+        return {test_number: tests[test_number] for test_number in order_test_numbers(tests)}
+
+    def get_records(self, keys):
+        """读取多条结果 {(炉号, 检测次数): 记录}，不在结果表中（未处理或已归档）的不返回"""
+        records = {}
+        with self.lock:
+            for furnace_number, test_number in keys:
+                row = self.conn.execute(
+                    "SELECT * FROM results WHERE furnace_number = ? AND test_number = ?", (furnace_number, test_number)
+                ).fetchone()
+                if row is not None:
+                    records[(furnace_number, test_number)] = row_to_record(row)
+        return records
+
+    def latest_furnaces(self, prefix, limit, exclude=()):
+        """炉号以 prefix 开头（即该炉组）的最新 limit 个炉号，按炉号数值降序
+
+        exclude 为要排除的更长前缀（属于其他炉组，见 LineConfig.nested_prefixes）。
+        """
+        return self._furnace_numbers("results", prefix, 0, limit, exclude)
+
+    def furnace_page(self, prefix, offset, limit, exclude=()):
+        """炉号以 prefix 开头（排除 exclude 前缀）的炉号中，按炉号数值降序跳过 offset 个后的 limit 个，用于分页浏览
+
+        按已处理索引查询，包括已归档（不在结果表中）的炉号，其记录由 archive.load_archived_furnace 读取。
+        """
+        return self._furnace_numbers("processed", prefix, offset, limit, exclude)
+
+    def _furnace_numbers(self, table, prefix, offset, limit, exclude):
+        conditions, params = prefix_conditions(prefix, exclude)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT DISTINCT furnace_number FROM {table} WHERE {' AND '.join(conditions)} "
+                "ORDER BY CAST(furnace_number AS INTEGER) DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def furnace_rank(self, prefix, furnace_number, exclude=()):
+        """炉组中炉号数值大于 furnace_number 的炉号个数，即它在 furnace_page 降序排列中的位置（从 0 开始）"""
+        conditions, params = prefix_conditions(prefix, exclude)
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT COUNT(DISTINCT furnace_number) FROM processed WHERE {' AND '.join(conditions)} "
+                "AND CAST(furnace_number AS INTEGER) > ?",
+                (*params, int(furnace_number)),
+            ).fetchone()[0]
+
+    def oldest_ts(self):
+        """最早一条结果的时间戳，没有数据时返回 None"""
+        with self.lock:
+            return self.conn.execute("SELECT MIN(ts) FROM results").fetchone()[0]
+
+    def records_between(self, start_ts, end_ts):
+        """时间戳在 [start_ts, end_ts) 内的结果 [(炉号, 检测次数, 记录)]，按时间索引查询"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM results WHERE ts >= ? AND ts < ? ORDER BY ts", (start_ts, end_ts)
+            ).fetchall()
+        return [(row[0], row[1], row_to_record(row)) for row in rows]
+
+    def query(self, brand=None, start_ts=None, end_ts=None, line=None, ranges=None, limit=None):
+        """按条件查询结果，返回按时间倒序的 [(炉号, 检测次数, 记录)]
+
+        brand 不区分大小写；时间戳范围为 [start_ts, end_ts)；line 为炉组号（按最长炉号前缀归属）；
+        ranges 为 {字段: (下限, 上限)}，字段为元素名或"污泥指数"，上下限包含端点、为 None 表示不限。
+        牌号、时间和炉组条件都可以使用索引。
+        """
+        conditions, params = query_conditions(brand, start_ts, end_ts, line, ranges)
+        sql = "SELECT * FROM results"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY ts DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [(row[0], row[1], row_to_record(row)) for row in rows]
+
+    def iter_query(self, brand=None, start_ts=None, end_ts=None, line=None, ranges=None, chunk_size=1000):
+        """按条件分块读取结果，按时间正序逐块返回 [(炉号, 检测次数, 记录)]，条件含义见 query
+
+        按 (时间戳, 炉号, 检测次数) 翻页（即时间索引的顺序），每块单独查询，块与块之间不占用数据库锁，
+        内存占用与总行数无关。
+        """
+        conditions, params = query_conditions(brand, start_ts, end_ts, line, ranges)
+        conditions.append("ts IS NOT NULL")  # 记录时间取自报告文件，正常不会为空
+        last = None
+        while True:
+            page_conditions, page_params = list(conditions), list(params)
+            if last is not None:
+                page_conditions.append("(ts, furnace_number, test_number) > (?, ?, ?)")
+                page_params.extend(last)
+            sql = f"SELECT * FROM results WHERE {' AND '.join(page_conditions)} ORDER BY ts, furnace_number, test_number LIMIT ?"
+            with self.lock:
+                rows = self.conn.execute(sql, [*page_params, chunk_size]).fetchall()
+            if not rows:
+                return
+            yield [(row[0], row[1], row_to_record(row)) for row in rows]
+            last = (rows[-1][-2], rows[-1][0], rows[-1][1])
+
+    def delete_between(self, start_ts, end_ts):
+        """删除时间戳在 [start_ts, end_ts) 内的结果（已处理索引保留），返回删除的行数"""
+        with self.lock, self.conn:
+            deleted = self.conn.execute("DELETE FROM results WHERE ts >= ? AND ts < ?", (start_ts, end_ts)).rowcount
+            # 已归档结果的派生值一并删除（归档文件中保存的是归档时的值，不再重新计算）
+            self.conn.execute(
+                "DELETE FROM derived_values WHERE NOT EXISTS (SELECT 1 FROM results r "
+                "WHERE r.furnace_number = derived_values.furnace_number AND r.test_number = derived_values.test_number)"
+            )
+            return deleted
+
+    def export_dict(self):
+        """导出全部数据，格式与 data.json 相同 {炉号: {检测次数: 记录}}"""
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM results ORDER BY furnace_number").fetchall()
+        data = {}
+        for row in rows:
+            data.setdefault(row[0], {})[row[1]] = row_to_record(row)
+        return {
+            furnace_number: {test_number: tests[test_number] for test_number in order_test_numbers(tests)}
+            for furnace_number, tests in data.items()
+        }
+
+    def import_json(self, data_file):
+        """一次性导入已有的 data.json，返回导入的行数"""
+        data = load_processed_data(data_file)
+        records = [
+            (furnace_number, test_number, record)
+            for furnace_number, tests in data.items()
+            for test_number, record in tests.items()
+        ]
+        self.upsert_records(records)
+        return len(records)
+
+    def export_json(self, output_file):
+        """导出为与 data.json 格式相同的文件，兼容旧程序"""
+        save_data_to_json(self.export_dict(), output_file)
+
+    def load_manifest(self):
+        """读取已见文件清单 {文件名: [大小, 修改时间]}"""
+        with self.lock:
+            rows = self.conn.execute("SELECT filename, size, mtime FROM files").fetchall()
+        return {filename: [size, mtime] for filename, size, mtime in rows}
+
+    def save_manifest_entries(self, entries):
+        """写入清单中新增或变化的条目 {文件名: [大小, 修改时间]}"""
+        rows = [(filename, size, mtime) for filename, (size, mtime) in entries.items()]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", rows)
+
+    def source_hashes(self, keys):
+        """结果来源文件的内容哈希 {(炉号, 检测次数): sha256}，没有记录来源的不返回"""
+        hashes = {}
+        with self.lock:
+            for key in keys:
+                row = self.conn.execute(
+                    "SELECT sha256 FROM sources WHERE furnace_number = ? AND test_number = ?", key
+                ).fetchone()
+                if row is not None:
+                    hashes[key] = row[0]
+        return hashes
+
+    def save_sources(self, rows):
+        """写入结果的来源文件 [(炉号, 检测次数, 文件名, 大小, 修改时间, sha256)]"""
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def save_superseded(self, rows):
+        """追加审计记录 [(炉号, 检测次数, 更正时间, 字段, 旧值, 新值, 旧 sha256, 新 sha256)]"""
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT INTO superseded VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def superseded_history(self, furnace_number):
+        """一个炉号被更正的历史 [(检测次数, 更正时间, 字段, 旧值, 新值)]，按更正时间排序"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT test_number, replaced_at, field, old_value, new_value FROM superseded "
+                "WHERE furnace_number = ? ORDER BY replaced_at, rowid",
+                (furnace_number,),
+            ).fetchall()
+
+    def load_spc(self):
+        """读取保存的 SPC 运行统计 [(炉组号, 牌号, 字段, n, 均值, m2, ewma, 游程方向, 游程长度)]"""
+        with self.lock:
+            return self.conn.execute("SELECT * FROM spc_stats").fetchall()
+
+    def save_spc(self, rows):
+        """写入有变化的 SPC 运行统计，行格式与 load_spc 相同"""
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO spc_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def delete_spc(self, keys):
+        """删除 SPC 运行统计 [(炉组号, 牌号, 字段)]（更正后已没有样本的键）"""
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM spc_stats WHERE line_id = ? AND brand = ? AND field = ?", keys)
+
+    def derived_formula(self, metric, version):
+        """某个派生指标某个版本登记过的表达式，没有登记时返回 None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT expression FROM derived_formulas WHERE metric = ? AND version = ?", (metric, version)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_derived_formula(self, metric, version, expression):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO derived_formulas VALUES (?, ?, ?)", (metric, version, expression))
+
+    def missing_derived_inputs(self, metric, version, fields, limit):
+        """还没有该版本派生值的结果 [(炉号, 检测次数, 各字段的值...)]，最多 limit 行"""
+        for field in fields:
+            if field not in RANGE_COLUMNS:
+                raise ValueError(f"派生指标 {metric} 不支持字段 {field}")
+        columns = ", ".join(f"r.{RANGE_COLUMNS[field]}" for field in fields)
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT r.furnace_number, r.test_number{', ' + columns if columns else ''} FROM results r "
+                "WHERE NOT EXISTS (SELECT 1 FROM derived_values d WHERE d.metric = ? AND d.version = ? "
+                "AND d.furnace_number = r.furnace_number AND d.test_number = r.test_number) LIMIT ?",
+                (metric, version, limit),
+            ).fetchall()
+
+    def save_derived_values(self, metric, version, rows):
+        """写入派生值 [(炉号, 检测次数, 值)]"""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO derived_values VALUES (?, ?, ?, ?, ?)",
+                [(metric, version, *row) for row in rows],
+            )
+
+    def active_derived_version(self, metric):
+        """已写回结果表的派生指标版本，没有时返回 None"""
+        with self.lock:
+            row = self.conn.execute("SELECT version FROM derived_active WHERE metric = ?", (metric,)).fetchone()
+        return row[0] if row else None
+
+    def apply_derived(self, metric, version, field):
+        """把某个版本的派生值写回结果表中对应的列（如污泥指数），返回更新的行数"""
+        column = RANGE_COLUMNS[field]
+        with self.lock, self.conn:
+            # 只更新有该版本派生值的行，其余行保留原值而不是被置为 NULL
+            count = self.conn.execute(
+                f"UPDATE results SET {column} = (SELECT d.value FROM derived_values d WHERE d.metric = ? AND d.version = ? "
+                "AND d.furnace_number = results.furnace_number AND d.test_number = results.test_number) "
+                "WHERE EXISTS (SELECT 1 FROM derived_values d WHERE d.metric = ? AND d.version = ? "
+                "AND d.furnace_number = results.furnace_number AND d.test_number = results.test_number)",
+                (metric, version, metric, version),
+            ).rowcount
+            self.conn.execute("INSERT OR REPLACE INTO derived_active VALUES (?, ?)", (metric, version))
+            # 统计值随之变化，清空 SPC 统计，下次加载时按新的值重建
+            self.conn.execute("DELETE FROM spc_stats")
+        return count
+
+
+if __name__ == "__main__":
+    # 命令行：data.json 与数据库之间的导入/导出
+    parser = argparse.ArgumentParser(description="检测结果数据库导入/导出")
+    parser.add_argument("action", choices=["import", "export"], help="import: data.json -> 数据库；export: 数据库 -> data.json")
+    parser.add_argument("json_file", nargs="?", default="data.json")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE)
+    args = parser.parse_args()
+
+    store = ResultStore(args.db)
+    if args.action == "import":
+        print(f"已导入 {store.import_json(args.json_file)} 条记录")
+    else:
+        store.export_json(args.json_file)
+        print(f"已导出 {store.count()} 条记录到 {args.json_file}")
+    store.close()
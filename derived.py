@@ -0,0 +1,180 @@
+import ast
+import json
+import os
+
+# 派生指标配置文件：每个指标的名称、版本号、表达式和保留的小数位数
+DERIVED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "derived_metrics.json")
+# 每批重新计算的行数
+RECOMPUTE_CHUNK_SIZE = 50000
+# 表达式中允许的运算
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub, ast.UAdd,
+)
+
+
+class DerivedMetric:
+    """一个派生指标：由元素含量计算的表达式，如污泥指数 "1 * Fe + 2 * Mn + 3 * Cr"
+
+    表达式只允许数字、元素名和四则运算（含乘方），同一份编译结果既可以计算单条记录（float），
+    也可以对整列（numpy 数组）做向量化计算；缺失的元素按 0 处理。
+    修改表达式时必须同时增加版本号，各版本的计算结果分别保存、互不覆盖。
+    """
+
+    def __init__(self, name, version, expression, digits=None):
+        self.name = name
+        self.version = version
+        self.expression = expression
+        self.digits = digits
+        tree = ast.parse(expression, mode="eval")
+        for node in ast.walk(tree):
+            if not isinstance(node, ALLOWED_NODES) or isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+                raise ValueError(f"派生指标 {name} 的表达式不支持 {type(node).__name__}: {expression}")
+        # 表达式中用到的字段，按出现顺序去重
+        self.fields = list(dict.fromkeys(node.id for node in ast.walk(tree) if isinstance(node, ast.Name)))
+        self.code = compile(tree, f"<{name} v{version}>", "eval")
+
+    def evaluate(self, values):
+        """计算一条记录，values 为 {元素: 含量}"""
+        result = eval(self.code, {"__builtins__": {}}, {field: values.get(field) or 0.0 for field in self.fields})
+        return self.round(result)
+
+    def evaluate_columns(self, columns, size):
+        """向量化计算 size 行，columns 为 {元素: float64 数组}（缺失为 NaN），返回未舍入的 float64 数组"""
+        import numpy as np  # 只有批量重新计算时才需要 numpy，入库（build_record）只用 evaluate
+        arrays = {field: np.nan_to_num(columns[field], nan=0.0) for field in self.fields}
+        return np.full(size, 0.0) + eval(self.code, {"__builtins__": {}}, arrays)  # 表达式为常数时也得到整列
+
+    def round(self, value):
+        """按配置的小数位数舍入；与 np.round 的结果在个别值上不同，两种计算方式都用这里的 round()，保证结果一致"""
+        return round(float(value), self.digits) if self.digits is not None else float(value)
+
+
+def load_derived_metrics(derived_file=DERIVED_FILE):
+    """从配置文件加载派生指标 {名称: DerivedMetric}，文件不存在时为空"""
+    if not os.path.exists(derived_file):
+        return {}
+    with open(derived_file, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    return {
+        metric["name"]: DerivedMetric(metric["name"], metric["version"], metric["expression"], metric.get("round"))
+        for metric in config.get("metrics", [])
+    }
+
+
+def file_mtime(derived_file=DERIVED_FILE):
+    return os.path.getmtime(derived_file) if os.path.exists(derived_file) else None
+
+
+def check_formulas(store, metrics_by_name):
+    """检查各指标的表达式与数据库中同一版本登记的表达式一致，修改了表达式却没有增加版本号时抛出 ValueError"""
+    for metric in metrics_by_name.values():
+        registered = store.derived_formula(metric.name, metric.version)
+        if registered is not None and registered != metric.expression:
+            raise ValueError(f"派生指标 {metric.name} 版本 {metric.version} 的表达式已修改，请增加版本号")
+
+
+def registered_metrics(store, metrics_by_name):
+    """把表达式与登记不一致的指标换回数据库中该版本登记的表达式（配置有误时继续按原公式计算）"""
+    restored = {}
+    for name, metric in metrics_by_name.items():
+        registered = store.derived_formula(metric.name, metric.version)
+        if registered is not None and registered != metric.expression:
+            metric = DerivedMetric(metric.name, metric.version, registered, metric.digits)
+        restored[name] = metric
+    return restored
+
+
+def reload_derived_metrics(store, derived_file=DERIVED_FILE):
+    """配置文件修改过时重新加载 derived_metrics，返回是否重新加载
+
+    新配置先加载到临时字典并与数据库中登记的表达式核对，通过后才原地替换 derived_metrics，
+    已经导入它的模块（如 data_processing.build_record）同时使用新公式。
+    配置有错误时抛出 ValueError 并保留原配置，之后直到文件再次修改前不再重复加载。
+    """
+    global derived_mtime
+    mtime = file_mtime(derived_file)
+    if mtime == derived_mtime:
+        return False
+    derived_mtime = mtime
+    loaded = load_derived_metrics(derived_file)
+    check_formulas(store, loaded)
+    derived_metrics.clear()
+    derived_metrics.update(loaded)
+    return True
+
+
+def recompute(store, metric, chunk_size=RECOMPUTE_CHUNK_SIZE):
+    """按批向量化计算数据库中还没有该版本派生值的结果，返回计算的行数
+
+    结果按 (指标, 版本) 保存，已经算过的版本不再重复计算（切换回旧版本时直接复用）；
+    只读取结果表中表达式用到的元素列，不需要重新读取原始 txt 报告。
+    """
+    import numpy as np
+
+    check_formulas(store, {metric.name: metric})
+    if store.derived_formula(metric.name, metric.version) is None:
+        store.save_derived_formula(metric.name, metric.version, metric.expression)
+
+    count = 0
+    while True:
+        rows = store.missing_derived_inputs(metric.name, metric.version, metric.fields, chunk_size)
+        if not rows:
+            return count
+        columns = {
+            field: np.array([row[2 + i] for row in rows], dtype=np.float64)  # None 转为 NaN
+            for i, field in enumerate(metric.fields)
+        }
+        values = metric.evaluate_columns(columns, len(rows))
+        store.save_derived_values(metric.name, metric.version, [
+            (row[0], row[1], metric.round(value)) for row, value in zip(rows, values)
+        ])
+        count += len(rows)
+
+
+def apply_derived_metrics(store, metrics_by_name=None, write_back=("污泥指数",), rewrite=False):
+    """补算所有派生指标的当前版本；write_back 中的指标（对应结果表中的列）版本变化时写回结果表
+
+    rewrite 为 True 时即使版本没有变化也重新写回（配置在运行中修改过，期间入库的结果可能用的是旧公式）。
+    返回 {指标: 本次计算的行数}。
+    """
+    metrics_by_name = derived_metrics if metrics_by_name is None else metrics_by_name
+    computed = {}
+    for name, metric in metrics_by_name.items():
+        computed[name] = recompute(store, metric)
+        if name in write_back and (rewrite or store.active_derived_version(name) != metric.version):
+            store.apply_derived(name, metric.version, name)
+    return computed
+
+
+def save_record_values(store, records, metrics_by_name=None):
+    """保存新入库结果 [(炉号, 检测次数, 记录)] 的派生值（当前版本），每轮入库时调用，只计算这些行"""
+    metrics_by_name = derived_metrics if metrics_by_name is None else metrics_by_name
+    for name, metric in metrics_by_name.items():
+        store.save_derived_values(name, metric.version, [
+            (furnace_number, test_number, metric.evaluate(record)) for furnace_number, test_number, record in records
+        ])
+
+
+# 当前的派生指标定义，程序启动时加载，长期运行的数据处理服务在配置文件修改后重新加载（reload_derived_metrics）
+derived_mtime = file_mtime()
+derived_metrics = load_derived_metrics()
+
+
+if __name__ == "__main__":
+    # 命令行：修改 derived_metrics.json 后按新公式重新计算全部历史
+    import argparse
+    import time
+
+    from data_store import DEFAULT_DB_FILE, ResultStore
+
+    parser = argparse.ArgumentParser(description="按派生指标配置重新计算历史结果")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE)
+    args = parser.parse_args()
+
+    store = ResultStore(args.db)
+    started = time.perf_counter()
+    for name, count in apply_derived_metrics(store).items():
+        print(f"{name} 版本 {derived_metrics[name].version}: 计算 {count} 行")
+    print(f"耗时 {time.perf_counter() - started:.2f}s")
+    store.close()
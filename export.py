@@ -0,0 +1,135 @@
+import argparse
+import csv
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+
+from archive import DEFAULT_ARCHIVE_DIR
+from data_processing import elements
+from data_store import ResultStore, parse_time
+from query import add_query_arguments, iter_results, query_ranges
+
+# 计算列：100 减去该行所有元素含量之和
+REMAINDER = "余量"
+# 导出列布局，与界面右键菜单复制的列一致
+LAYOUTS = {
+    "ADC12Z": ["Si", "Cu", "Mg", "Fe", "Zn", "Ni", "Mn", "Ti", "Sn", "Pb", "Al"],
+    "ALSI10": ["Si", "Cu", "Mg", "Fe", "Zn", "Ni", "Mn", "Ti", "Sn", REMAINDER, "Al"],
+    "全部": [*elements, "污泥指数"],
+}
+# 每行开头的标识列
+ID_COLUMNS = ["炉号", "次数", "牌号", "时间"]
+# 每次从数据库读取的行数
+EXPORT_CHUNK_SIZE = 1000
+
+
+def layout_values(layout, record):
+    """按布局取一条记录的数值列表
+
+    ALSI10 与复制到剪贴板时相同：缺失的元素按 0 处理，余量 = 100 - 所有列之和（保留 4 位小数）；
+    其他布局缺失的值为 None。
+    """
+    columns = LAYOUTS[layout]
+    if REMAINDER not in columns:
+        return [record.get(column) for column in columns]
+    values = [float(record.get(column) or 0) for column in columns if column != REMAINDER]
+    remainder = round(100 - sum(values), 4)
+    position = columns.index(REMAINDER)
+    return values[:position] + [remainder] + values[position:]
+
+
+def format_value(value):
+    """与表格显示相同：缺失为空字符串，数值按 str() 输出"""
+    return "" if value is None else str(value)
+
+
+def write_csv(output_file, chunks, layout):
+    """逐块写出 CSV（UTF-8 带 BOM，Excel 可以直接打开），返回行数"""
+    count = 0
+    with open(output_file, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(ID_COLUMNS + LAYOUTS[layout])
+        for chunk in chunks:
+            writer.writerows(
+                [furnace_number, test_number, record.get("牌号") or "", record.get("time") or "",
+                 *map(format_value, layout_values(layout, record))]
+                for furnace_number, test_number, record in chunk
+            )
+            count += len(chunk)
+    return count
+
+
+def write_columnar(output_file, chunks, layout):
+    """逐块写出列式文件（.npz，可以用 numpy.load 读取），返回行数
+
+    每列先按块追加到临时文件，最后拼成 npz 中的 .npy 成员，内存中只保留一块数据。
+    数值列为 float64（缺失为 NaN）；炉号、时间戳为 int64；检测次数和牌号按编码保存，
+    编码对应的文字在 test_labels、brand_labels 中（牌号编码 -1 表示未识别），与 history_store.ColumnarHistory 相同。
+    """
+    columns = LAYOUTS[layout]
+    dtypes = {column: np.float64 for column in columns}
+    dtypes.update(furnace=np.int64, test=np.int32, timestamp=np.int64, brand=np.int16)
+    test_codes, brand_codes = {}, {}
+    count = 0
+    with tempfile.TemporaryDirectory() as temp_dir:
+        parts = {name: open(os.path.join(temp_dir, str(i)), "w+b") for i, name in enumerate(dtypes)}
+        try:
+            for chunk in chunks:
+                arrays = {
+                    "furnace": [int(furnace_number) for furnace_number, _, _ in chunk],
+                    "test": [test_codes.setdefault(test_number, len(test_codes)) for _, test_number, _ in chunk],
+                    "timestamp": [parse_time(record.get("time")) or 0 for _, _, record in chunk],
+                    "brand": [-1 if record.get("牌号") is None else brand_codes.setdefault(record["牌号"], len(brand_codes))
+                              for _, _, record in chunk],
+                }
+                rows = [layout_values(layout, record) for _, _, record in chunk]
+                for i, column in enumerate(columns):
+                    arrays[column] = [np.nan if row[i] is None else row[i] for row in rows]
+                for name, values in arrays.items():
+                    parts[name].write(np.asarray(values, dtype=dtypes[name]).tobytes())
+                count += len(chunk)
+
+            with zipfile.ZipFile(output_file, "w", zipfile.ZIP_DEFLATED) as archive:
+                for name, part in parts.items():
+                    part.seek(0)
+                    with archive.open(f"{name}.npy", "w", force_zip64=True) as member:
+                        np.lib.format.write_array_header_1_0(
+                            member, {"descr": np.dtype(dtypes[name]).str, "fortran_order": False, "shape": (count,)}
+                        )
+                        shutil.copyfileobj(part, member)
+                for name, labels in (("test_labels", test_codes), ("brand_labels", brand_codes)):
+                    with archive.open(f"{name}.npy", "w") as member:
+                        np.lib.format.write_array(member, np.array(list(labels), dtype=str))
+        finally:
+            for part in parts.values():
+                part.close()
+    return count
+
+
+def export_results(store, output_file, layout="ADC12Z", brand=None, start=None, end=None, line=None, ranges=None,
+                   archive_dir=DEFAULT_ARCHIVE_DIR, chunk_size=EXPORT_CHUNK_SIZE):
+    """按条件导出全部历史（含归档），按时间正序；文件扩展名为 .npz 时写列式文件，否则写 CSV。返回导出的行数"""
+    if layout not in LAYOUTS:
+        raise ValueError(f"未知的导出布局: {layout}")
+    chunks = iter_results(store, brand, start, end, line, ranges, archive_dir, chunk_size)
+    if output_file.lower().endswith(".npz"):
+        return write_columnar(output_file, chunks, layout)
+    return write_csv(output_file, chunks, layout)
+
+
+if __name__ == "__main__":
+    # 命令行：按条件导出，如 python export.py 2025-02.csv --layout ALSI10 --start 2025-02-01 --end "2025-02-28 23:59:59"
+    parser = argparse.ArgumentParser(description="检测结果批量导出")
+    parser.add_argument("output_file", help="输出文件，.csv 或 .npz")
+    parser.add_argument("--layout", choices=list(LAYOUTS), default="ADC12Z")
+    add_query_arguments(parser)
+    args = parser.parse_args()
+
+    store = ResultStore(args.db)
+    count = export_results(store, args.output_file, args.layout, args.brand, args.start, args.end, args.line,
+                           query_ranges(args.min, args.max), args.archive)
+    print(f"已导出 {count} 条记录到 {args.output_file}")
+    store.close()
@@ -0,0 +1,130 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from archive import load_archived_furnace
+from data_processing import order_test_numbers
+
+# 每页的炉号数量
+PAGE_SIZE = 50
+# 缓存的页数和最近查看的炉号数量
+PAGE_CACHE_SIZE = 8
+FURNACE_CACHE_SIZE = 64
+# 翻页时预取本页前几个炉号的记录
+PREFETCH_FURNACES = 5
+
+
+class FurnacePager:
+    """按页浏览一个炉组在数据库中的全部炉号（按炉号降序），界面进程中只保留少量页和最近查看的炉号
+
+    页和炉号记录都保存在 LRU 缓存中；翻到某页时在后台线程预取相邻的页和本页前几个炉号的记录。
+    offset 为第 1 页之前跳过的炉号数量（第 0 页为界面上实时更新的最新炉次）；
+    exclude 为属于其他炉组的更长前缀（见 LineConfig.nested_prefixes）；
+    archive_dir 不为 None 时同时从归档中读取已归档炉号的记录（页中包括已归档的炉号）。
+    """
+
+    def __init__(self, store, prefix, offset=0, page_size=PAGE_SIZE, executor=None, exclude=(), archive_dir=None):
+        self.store = store
+        self.prefix = prefix
+        self.exclude = tuple(exclude)
+        self.archive_dir = archive_dir
+        self.offset = offset
+        self.page_size = page_size
+        self.executor = executor or ThreadPoolExecutor(max_workers=1)
+        self.lock = threading.Lock()
+        self.pages = OrderedDict()  # {页号: [炉号]}
+        self.furnaces = OrderedDict()  # {炉号: {检测次数: 记录}}
+        self.generation = 0  # 数据变化时加一，丢弃变化前开始的预取结果
+
+    @staticmethod
+    def _get(cache, key):
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _put(cache, key, value, size):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+    def _load_page(self, number):
+        with self.lock:
+            furnaces = self._get(self.pages, number)
+            generation = self.generation
+        if furnaces is None:
+            furnaces = self.store.furnace_page(self.prefix, self.offset + (number - 1) * self.page_size, self.page_size,
+                                               self.exclude)
+            with self.lock:
+                if generation == self.generation:
+                    self._put(self.pages, number, furnaces, PAGE_CACHE_SIZE)
+        return furnaces
+
+    def _load_furnace(self, furnace_number):
+        with self.lock:
+            records = self._get(self.furnaces, furnace_number)
+            generation = self.generation
+        if records is None:
+            records = self.store.get_furnace(furnace_number)
+            if self.archive_dir is not None:
+                # 跨月的炉号可能一部分已归档，合并两处的记录（数据库中的较新）
+                archived = load_archived_furnace(furnace_number, self.archive_dir)
+                if archived:
+                    tests = {**archived, **records}
+                    records = {test_number: tests[test_number] for test_number in order_test_numbers(tests)}
+            with self.lock:
+                if generation == self.generation:
+                    self._put(self.furnaces, furnace_number, records, FURNACE_CACHE_SIZE)
+        return records
+
+    def _prefetch(self, number):
+        for page in (number + 1, number - 1):
+            if page >= 1:
+                self._load_page(page)
+        for furnace_number in self._load_page(number)[:PREFETCH_FURNACES]:
+            self._load_furnace(furnace_number)
+
+    def page(self, number):
+        """第 number 页（从 1 开始）的炉号列表，超出范围时为空列表；同时在后台预取相邻的页"""
+        furnaces = self._load_page(number)
+        if furnaces:
+            self.executor.submit(self._prefetch, number)
+        return furnaces
+
+    def page_of(self, furnace_number):
+        """炉号所在的页号（从 1 开始），属于第 1 页之前（最新炉次）时为 0"""
+        rank = self.store.furnace_rank(self.prefix, furnace_number, self.exclude)
+        if rank < self.offset:
+            return 0
+        return (rank - self.offset) // self.page_size + 1
+
+    def records(self, furnace_number):
+        """一个炉号的全部检测记录 {检测次数: 记录}，不存在时为空字典"""
+        return self._load_furnace(furnace_number)
+
+    def invalidate(self):
+        """清空全部缓存"""
+        with self.lock:
+            self.generation += 1
+            self.pages.clear()
+            self.furnaces.clear()
+
+    def invalidate_pages(self):
+        """该炉组有新炉号时清空页缓存（新炉号会使页的位置整体后移），已缓存的炉号记录不受影响"""
+        with self.lock:
+            self.generation += 1
+            self.pages.clear()
+
+    def evict(self, furnace_numbers):
+        """丢弃这些炉号的缓存记录（新增了检测次数或报告被更正）"""
+        with self.lock:
+            self.generation += 1
+            for furnace_number in furnace_numbers:
+                self.furnaces.pop(furnace_number, None)
+
+    def cached_in_pages(self, furnace_number):
+        """炉号是否在已缓存的某一页中（在的话说明不是新炉号，页的位置没有变化）"""
+        with self.lock:
+            return any(furnace_number in furnaces for furnaces in self.pages.values())
@@ -0,0 +1,200 @@
+import math
+from datetime import datetime
+
+import numpy as np
+
+from data_processing import elements, order_test_numbers
+from data_store import RANGE_COLUMNS, TIME_FORMAT, parse_time
+from line_config import lines
+
+# 记录中除元素外的数值列
+SLUDGE_COLUMN = "污泥指数"
+
+
+class ColumnarHistory:
+    """按列存储的检测历史
+
+    每个元素一个 float64 数组（缺失为 NaN），另有炉号、炉组、检测次数编码、时间戳、牌号编码数组。
+    相比 {炉号: {检测次数: {元素: 值}}} 的嵌套字典，不再为每条记录重复保存 15 个字符串键，
+    并且可以用向量化的布尔掩码按牌号、时间段、超限条件筛选。
+    """
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.capacity = capacity
+        self.values = {column: np.full(capacity, np.nan) for column in [*elements, SLUDGE_COLUMN]}
+        self.furnace = np.zeros(capacity, dtype=np.int64)
+        self.line = np.full(capacity, -1, dtype=np.int16)  # 炉组在 lines.ids 中的序号，-1 表示不属于任何炉组
+        self.test = np.zeros(capacity, dtype=np.int32)  # 检测次数编码，对应 test_labels
+        self.timestamp = np.zeros(capacity, dtype=np.int64)  # 秒级时间戳，0 表示缺少时间
+        self.brand = np.full(capacity, -1, dtype=np.int16)  # 牌号编码，对应 brand_labels，-1 表示未识别
+        self.test_labels, self.test_codes = [], {}
+        self.brand_labels, self.brand_codes = [], {}
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        """所有数组占用的内存字节数"""
+        arrays = [*self.values.values(), self.furnace, self.line, self.test, self.timestamp, self.brand]
+        return sum(array.nbytes for array in arrays)
+
+    def _grow(self, needed):
+        """容量不足时按倍数扩容，保证追加的均摊开销为 O(1)"""
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2)
+        for column, array in self.values.items():
+            self.values[column] = np.concatenate([array, np.full(capacity - self.capacity, np.nan)])
+        for name, fill in (("furnace", 0), ("line", -1), ("test", 0), ("timestamp", 0), ("brand", -1)):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.full(capacity - self.capacity, fill, dtype=array.dtype)]))
+        self.capacity = capacity
+
+    @staticmethod
+    def _encode(label, labels, codes):
+        if label not in codes:
+            codes[label] = len(labels)
+            labels.append(label)
+        return codes[label]
+
+    def append(self, furnace_number, test_number, record):
+        """追加一条记录（与 data.json 中的记录格式相同）"""
+        self._grow(self.size + 1)
+        i = self.size
+        for column, array in self.values.items():
+            value = record.get(column)
+            array[i] = np.nan if value is None else value
+        self.furnace[i] = int(furnace_number)
+        line_id = lines.line_of(furnace_number)
+        self.line[i] = -1 if line_id is None else lines.ids.index(line_id)
+        self.test[i] = self._encode(test_number, self.test_labels, self.test_codes)
+        self.timestamp[i] = parse_time(record.get("time")) or 0
+        brand = record.get("牌号")
+        self.brand[i] = -1 if brand is None else self._encode(brand, self.brand_labels, self.brand_codes)
+        self.size += 1
+
+    def extend(self, records):
+        """批量追加 [(炉号, 检测次数, 记录)]"""
+        records = list(records)
+        self._grow(self.size + len(records))
+        for furnace_number, test_number, record in records:
+            self.append(furnace_number, test_number, record)
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 data.json 格式的 {炉号: {检测次数: 记录}} 转换"""
+        count = sum(len(tests) for tests in data.values())
+        history = cls(capacity=max(count, 1))
+        history.extend(
+            (furnace_number, test_number, record)
+            for furnace_number, tests in data.items()
+            for test_number, record in tests.items()
+        )
+        return history
+
+    def record(self, i):
+        """第 i 条记录（与 data.json 中的记录格式相同）"""
+        record = {}
+        for column in elements:
+            value = self.values[column][i]
+            if not math.isnan(value):
+                record[column] = float(value)
+        sludge_index = self.values[SLUDGE_COLUMN][i]
+        record[SLUDGE_COLUMN] = None if math.isnan(sludge_index) else float(sludge_index)
+        ts = int(self.timestamp[i])
+        record["time"] = datetime.fromtimestamp(ts).strftime(TIME_FORMAT) if ts else None
+        record["牌号"] = None if self.brand[i] < 0 else self.brand_labels[self.brand[i]]
+        return record
+
+    def rows(self, mask=None):
+        """筛选出的记录 [(炉号, 检测次数, 记录)]，mask 为布尔掩码（为 None 时返回全部）"""
+        indexes = np.arange(self.size) if mask is None else np.flatnonzero(mask)
+        return [(str(self.furnace[i]), self.test_labels[self.test[i]], self.record(i)) for i in indexes]
+
+    def to_dict(self, mask=None):
+        """转换回 data.json 格式，mask 为筛选用的布尔掩码（为 None 时导出全部）"""
+        data = {}
+        for furnace_number, test_number, record in self.rows(mask):
+            data.setdefault(furnace_number, {})[test_number] = record
+        return {
+            furnace_number: {test_number: tests[test_number] for test_number in order_test_numbers(tests)}
+            for furnace_number, tests in data.items()
+        }
+
+    def column(self, name):
+        """取一列有效部分的视图"""
+        return self.values[name][:self.size]
+
+    def mask_brand(self, brand):
+        """按牌号筛选（不区分大小写）"""
+        codes = [code for label, code in self.brand_codes.items() if label.upper() == brand.upper()]
+        return np.isin(self.brand[:self.size], codes)
+
+    def mask_line(self, line_id):
+        """按炉组筛选，炉号按最长前缀归属到炉组（LineConfig.line_of）"""
+        if line_id not in lines.ids:
+            return np.zeros(self.size, dtype=bool)
+        return self.line[:self.size] == lines.ids.index(line_id)
+
+    def mask_time(self, start=None, end=None):
+        """按时间段筛选，start/end 为 datetime 或时间戳，包含两端；指定了时间段时缺少时间的记录不满足条件"""
+        timestamps = self.timestamp[:self.size]
+        mask = np.ones(self.size, dtype=bool)
+        if start is not None or end is not None:
+            mask &= timestamps != 0
+        if start is not None:
+            mask &= timestamps >= (start.timestamp() if isinstance(start, datetime) else start)
+        if end is not None:
+            mask &= timestamps <= (end.timestamp() if isinstance(end, datetime) else end)
+        return mask
+
+    def mask_query(self, brand=None, start_ts=None, end_ts=None, line=None, ranges=None):
+        """按查询条件筛选，条件含义与 ResultStore.query 相同（时间戳范围为 [start_ts, end_ts)）"""
+        mask = np.ones(self.size, dtype=bool)
+        if brand:
+            mask &= self.mask_brand(brand)
+        if line:
+            mask &= self.mask_line(line)
+        if start_ts is not None or end_ts is not None:
+            timestamps = self.timestamp[:self.size]
+            mask &= timestamps != 0
+            if start_ts is not None:
+                mask &= timestamps >= start_ts
+            if end_ts is not None:
+                mask &= timestamps < end_ts
+        for field, (low, high) in (ranges or {}).items():
+            if field not in RANGE_COLUMNS:
+                raise ValueError(f"不支持按 {field} 筛选")
+            values = self.column(field)  # 缺失值为 NaN，与 SQL 一致不满足范围条件
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        return mask
+
+    def mask_exceeds(self, element, limit):
+        """某元素含量大于 limit 的记录（缺失值不算超限）"""
+        return self.column(element) > limit
+
+    def mask_out_of_spec(self, specs, colors=("red",)):
+        """按牌号规格（brand_specs.BrandSpecs）筛选落在指定颜色区间内的记录，缺失的元素按 0 处理"""
+        mask = np.zeros(self.size, dtype=bool)
+        brand_codes = self.brand[:self.size]
+        for label, code in self.brand_codes.items():
+            rules = specs.rules.get(label.upper())
+            if not rules:
+                continue
+            in_brand = brand_codes == code
+            for element, bands in rules:
+                values = np.nan_to_num(self.column(element), nan=0.0)
+                unclaimed = in_brand.copy()  # 与逐条判定一致：每个值只取第一个匹配的区间
+                for low, low_inclusive, high, high_inclusive, color in bands:
+                    above = values >= low if low_inclusive else values > low
+                    below = values <= high if high_inclusive else values < high
+                    hit = unclaimed & above & below
+                    unclaimed &= ~hit
+                    if color in colors:
+                        mask |= hit
+        return mask
@@ -0,0 +1,139 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+# 数据处理服务监听的本机地址和端口
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# 数据处理服务的入口脚本，以及自动启动时的输出日志
+SERVICE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_service.py")
+SERVICE_LOG = "ingest_service.log"
+# 连接断开后的重连间隔，单位为秒
+RECONNECT_INTERVAL = 2
+# 自动启动服务后，至少等待多久才再次尝试启动，单位为秒
+SERVICE_START_INTERVAL = 30
+
+
+def encode_message(message_type, **fields):
+    """编码一条消息：每行一个 JSON 对象，type 为消息类型
+
+    消息类型：
+    - snapshots: {"snapshots": {炉组号: {炉号: {检测次数: 记录}}}, "changed": [炉组号]}，只包含有变化的炉组
+    - synced: 第一轮同步完成
+    - spc: {"summary": {炉组号: {"stats": [[牌号, 字段, 统计]], "alarms": [报警]}}}
+    - metrics: {"snapshot": 数据处理服务的 metrics.snapshot()}
+    - updated: {"furnaces": [炉号]}，本轮新增或更正了结果的炉号（包括不在快照中的更早炉号）
+
+    客户端发给服务的请求为单独一行文字，见 ServiceClient.request_state。
+    """
+    return (json.dumps({"type": message_type, **fields}, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def decode_message(line):
+    """解码一行消息，spc 统计的键还原为 (牌号, 字段)"""
+    message = json.loads(line)
+    if message["type"] == "spc":
+        message["summary"] = {
+            line_id: {"stats": {(brand, field): stats for brand, field, stats in line["stats"]},
+                      "alarms": line["alarms"]}
+            for line_id, line in message["summary"].items()
+        }
+    return message
+
+
+def encode_spc(summary):
+    """SpcTracker.summary() 转为可以编码的形式（JSON 的键只能是字符串）"""
+    return {
+        line_id: {"stats": [[brand, field, stats] for (brand, field), stats in line["stats"].items()],
+                  "alarms": line["alarms"]}
+        for line_id, line in summary.items()
+    }
+
+
+def start_service():
+    """在后台启动数据处理服务（与当前程序使用相同的 Python 和工作目录），界面退出后服务继续运行"""
+    options = {}
+    if os.name == "nt":
+        options["creationflags"] = subprocess.CREATE_NO_WINDOW
+    else:
+        options["start_new_session"] = True
+    with open(SERVICE_LOG, "ab") as log:
+        subprocess.Popen([sys.executable, SERVICE_SCRIPT], stdin=subprocess.DEVNULL, stdout=log,
+                         stderr=subprocess.STDOUT, **options)
+
+
+class ServiceClient:
+    """订阅数据处理服务推送的快照和事件，断开后自动重连
+
+    回调都在接收线程中调用：on_message(消息)，on_connection(是否已连接)。
+    连接不上且 auto_start 为 True 时自动启动服务；多个界面同时启动服务时只有一个能监听端口，其余自动退出。
+    """
+
+    def __init__(self, on_message, on_connection=None, host=DEFAULT_HOST, port=DEFAULT_PORT, auto_start=True):
+        self.on_message = on_message
+        self.on_connection = on_connection
+        self.host = host
+        self.port = port
+        self.auto_start = auto_start
+        self.started_at = None  # 上次自动启动服务的时刻
+        self.sock = None  # 当前连接，未连接时为 None
+
+    def start(self):
+        """启动接收线程（守护线程，界面退出时一并退出）"""
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        return thread
+
+    def request_state(self):
+        """请求服务重新发送完整的当前状态（手动刷新、兜底刷新时使用），未连接时返回 False"""
+        sock = self.sock
+        if sock is None:
+            return False
+        try:
+            sock.sendall(b"state\n")
+        except OSError:
+            return False
+        return True
+
+    def notify(self, callback, *args):
+        """调用回调，回调出错时只打印，不影响接收和重连"""
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"处理数据处理服务的消息出错: {e}")
+
+    def receive(self, sock):
+        """逐行接收消息直到连接断开；收到不完整或无法解析的一行（服务在发送中途退出）时断开重连"""
+        for line in sock.makefile("rb"):
+            try:
+                message = decode_message(line)
+            except (ValueError, KeyError, TypeError) as e:  # 包括 JSONDecodeError 和 UnicodeDecodeError
+                print(f"数据处理服务的消息无法解析，重新连接: {e}")
+                return
+            self.notify(self.on_message, message)
+
+    def run(self):
+        while True:
+            try:
+                with socket.create_connection((self.host, self.port), timeout=RECONNECT_INTERVAL) as sock:
+                    sock.settimeout(None)
+                    self.sock = sock
+                    if self.on_connection:
+                        self.notify(self.on_connection, True)
+                    try:
+                        self.receive(sock)
+                    finally:
+                        self.sock = None
+                        if self.on_connection:
+                            self.notify(self.on_connection, False)
+            except OSError:
+                if self.auto_start and (self.started_at is None
+                                        or time.monotonic() - self.started_at > SERVICE_START_INTERVAL):
+                    print("数据处理服务未运行，自动启动")
+                    start_service()
+                    self.started_at = time.monotonic()
+            time.sleep(RECONNECT_INTERVAL)
@@ -0,0 +1,355 @@
+import os
+import queue
+import socketserver
+import threading
+import time
+
+from archive import archive_old_partitions
+from data_processing import watch_folder, save_line_snapshots, LatestFurnaceIndex, save_snapshot_file
+from data_store import ResultStore
+from derived import (apply_derived_metrics, check_formulas, derived_metrics, registered_metrics,
+                     reload_derived_metrics, save_record_values)
+from ingest_client import DEFAULT_HOST, DEFAULT_PORT, encode_message, encode_spc
+from line_config import lines
+from metrics import metrics, setup_metrics_log, serve_metrics
+from share_access import ReportShare
+from spc import SpcTracker, record_keys
+
+# 服务监听的本机地址和端口，界面按此地址订阅
+service_host = DEFAULT_HOST
+service_port = DEFAULT_PORT
+# 每个客户端积压的消息上限，超出时清空积压、改为发送一次完整状态
+client_queue_size = 100
+# 向客户端推送指标的间隔，单位为秒（同时作为心跳）
+metrics_push_interval = 1
+# 是否同时原子写出各炉组的 JSON 文件（可选的旁路输出，供旧版界面使用）
+write_line_files = True
+# 最近发布的炉组快照（JSON），界面启动时优先加载，立即显示
+snapshot_file = "snapshot.json"
+# txt 文件所在的文件夹路径，需要替换为实际路径
+txtfolder_path = r"\\192.168.101.150\\cp"
+# 旧版处理后的数据 JSON 文件，首次启动时导入数据库
+dataoutput_file = "data.json"
+# 检测结果数据库，同时保存已见文件清单（文件名、大小、修改时间）
+database_file = "data.db"
+# 历史结果归档目录，以及数据库中保留的月数（更早的按月压缩归档）
+archive_dir = "archive"
+retention_months = 12
+# 监视模式的轮询间隔，单位为秒
+watch_interval = 1
+# 同时访问共享目录的最大连接数
+max_share_connections = 8
+# 每次访问共享目录的超时时间，以及共享目录不可用时的最长退避等待时间，单位为秒
+share_timeout = 10
+max_share_backoff = 60
+# 报告文件的本地镜像目录，解析和重新处理都从本地副本进行
+mirror_dir = "mirror"
+# 结构化指标日志文件（按大小轮转）
+metrics_log_file = "metrics.log"
+# 本机指标 HTTP 服务端口（GET /metrics），为 None 时不启动
+metrics_port = None
+
+
+def open_store():
+    """打开检测结果数据库，数据库为空时一次性导入旧版 data.json"""
+    store = ResultStore(database_file)
+    if store.processed_count() == 0:  # 结果可能已全部归档，按已处理索引判断是否首次使用
+        print(f"首次使用数据库，导入 {dataoutput_file}")
+        store.import_json(dataoutput_file)
+    return store
+
+
+def archive_history(store):
+    """按保留期归档旧的结果"""
+    archived = archive_old_partitions(store, archive_dir, retention_months)
+    if archived:
+        print(f"已归档 {len(archived)} 个月的历史结果")
+
+
+def update_derived(store, rewrite=False):
+    """补算派生指标（如污泥指数）全部历史的当前版本，公式版本变化（或 rewrite 为 True）时写回结果表
+
+    需要扫描全表，只在启动时和配置修改后调用；每轮新入库的结果由 save_record_values 单独保存。
+    """
+    try:
+        check_formulas(store, derived_metrics)
+    except ValueError as e:
+        # 启动时配置就有错误：入库和补算都按数据库中登记的原公式进行
+        print(f"派生指标配置错误，按数据库中登记的公式计算: {e}")
+        metrics.log("error", error=str(e))
+        restored = registered_metrics(store, derived_metrics)
+        derived_metrics.clear()
+        derived_metrics.update(restored)
+    try:
+        computed = apply_derived_metrics(store, rewrite=rewrite)
+    except ValueError as e:
+        print(f"派生指标配置错误: {e}")
+        metrics.log("error", error=str(e))
+        return
+    for name, count in computed.items():
+        if count:
+            print(f"派生指标 {name}: 计算 {count} 行")
+
+
+def reload_derived(store):
+    """派生指标配置文件修改过时重新加载，按新公式补算并重新写回结果表，返回是否重新加载
+
+    命令行（python derived.py）修改公式后，服务不会再用旧公式写回；两者之间入库的结果也按新公式重写。
+    """
+    try:
+        if not reload_derived_metrics(store):
+            return False
+    except ValueError as e:
+        print(f"派生指标配置错误，继续使用原配置: {e}")
+        metrics.log("error", error=str(e))
+        return False
+    print("派生指标配置已修改，重新计算")
+    update_derived(store, rewrite=True)
+    return True
+
+
+class Broadcaster:
+    """保存最新的快照、同步状态和 SPC 统计，并把变化推送给所有已连接的客户端
+
+    每个客户端一个消息队列，由各自的连接线程发送，慢的客户端不会阻塞数据处理。
+    新连接的客户端先收到完整的当前状态，之后只收到有变化的炉组。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients = set()
+        self.snapshots = {}
+        self.synced = False
+        self.spc = None
+
+    def state_messages(self):
+        """完整的当前状态（调用时需持有锁）"""
+        messages = []
+        if self.snapshots:
+            messages.append(encode_message("snapshots", snapshots=self.snapshots, changed=list(self.snapshots)))
+        if self.synced:
+            messages.append(encode_message("synced"))
+        if self.spc is not None:
+            messages.append(encode_message("spc", summary=self.spc))
+        return messages
+
+    def subscribe(self):
+        """登记一个客户端，返回它的消息队列（已放入完整的当前状态）"""
+        client = queue.Queue(client_queue_size)
+        with self.lock:
+            for message in self.state_messages():
+                client.put_nowait(message)
+            self.clients.add(client)
+        return client
+
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.discard(client)
+
+    @staticmethod
+    def clear(client):
+        """丢弃客户端队列中积压的消息"""
+        while not client.empty():
+            try:
+                client.get_nowait()
+            except queue.Empty:
+                break
+
+    def enqueue(self, client, message):
+        """把一条消息放入客户端的队列（调用时需持有锁）"""
+        try:
+            client.put_nowait(message)
+        except queue.Full:
+            # 客户端处理不过来：丢弃积压的增量，改为发送完整状态
+            self.clear(client)
+            for state in self.state_messages():
+                client.put_nowait(state)
+
+    def broadcast(self, message):
+        """把一条消息放入所有客户端的队列（调用时需持有锁）"""
+        for client in self.clients:
+            self.enqueue(client, message)
+
+    def resend_state(self, client):
+        """客户端请求时（手动刷新、兜底刷新）重新发送完整的当前状态"""
+        with self.lock:
+            for message in self.state_messages():
+                self.enqueue(client, message)
+
+    def close(self, client):
+        """客户端断开：注销并让它的发送循环结束"""
+        with self.lock:
+            self.clients.discard(client)
+            self.clear(client)
+            client.put_nowait(None)
+
+    def publish_snapshots(self, snapshots, changed):
+        with self.lock:
+            self.snapshots = snapshots
+            self.broadcast(encode_message("snapshots", snapshots={line_id: snapshots[line_id] for line_id in changed},
+                                          changed=sorted(changed)))
+
+    def publish_synced(self):
+        with self.lock:
+            self.synced = True
+            self.broadcast(encode_message("synced"))
+
+    def publish_spc(self, summary):
+        with self.lock:
+            self.spc = encode_spc(summary)
+            self.broadcast(encode_message("spc", summary=self.spc))
+
+    def publish_updated(self, furnaces):
+        """本轮有结果变化的炉号（不保存为状态，界面据此丢弃缓存的更早炉号记录）"""
+        with self.lock:
+            self.broadcast(encode_message("updated", furnaces=sorted(furnaces)))
+
+    def publish_metrics(self):
+        with self.lock:
+            self.broadcast(encode_message("metrics", snapshot=metrics.snapshot()))
+
+
+class SubscriberHandler(socketserver.BaseRequestHandler):
+    """一个客户端连接：按顺序发送它队列中的消息，客户端断开时注销
+
+    另有一个线程读取客户端的请求：每行一个请求，目前只有 "state"（重新发送完整的当前状态）。
+    """
+
+    def handle(self):
+        broadcaster = self.server.broadcaster
+        client = broadcaster.subscribe()
+        threading.Thread(target=self.read_requests, args=(broadcaster, client), daemon=True).start()
+        try:
+            while True:
+                message = client.get()
+                if message is None:
+                    break
+                self.request.sendall(message)
+        except OSError:
+            pass
+        finally:
+            broadcaster.unsubscribe(client)
+
+    def read_requests(self, broadcaster, client):
+        try:
+            for line in self.request.makefile("rb"):
+                if line.strip() == b"state":
+                    broadcaster.resend_state(client)
+        except OSError:
+            pass
+        finally:
+            broadcaster.close(client)
+
+
+class IngestServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    # Windows 上允许重用地址时第二个服务也能监听同一端口，只在其他系统上开启（加快重启）
+    allow_reuse_address = os.name != "nt"
+
+    def __init__(self, address, broadcaster):
+        super().__init__(address, SubscriberHandler)
+        self.broadcaster = broadcaster
+
+
+def publish_snapshots(index, broadcaster):
+    """把各炉组快照推送给客户端，只写出、只推送有变化的炉组"""
+    snapshots = index.snapshots()
+    changed = index.pop_changed()
+    if write_line_files:
+        save_line_snapshots(snapshots, changed)
+    save_snapshot_file(snapshots, snapshot_file)
+    broadcaster.publish_snapshots(snapshots, changed)
+
+
+def push_metrics(broadcaster):
+    """定时向客户端推送指标"""
+    while True:
+        time.sleep(metrics_push_interval)
+        broadcaster.publish_metrics()
+
+
+def run_ingestion(broadcaster):
+    """以监视模式运行：增量轮询 txt 文件夹，只处理新增或变化的文件，有变化时推送给客户端"""
+    store = open_store()
+    archive_history(store)
+    archived_on = time.strftime("%Y-%m-%d")
+    # 公式版本变化时先按新公式重新计算历史，再建立索引和 SPC 统计
+    update_derived(store)
+    # 各炉组最新炉次索引，入库时增量更新
+    index = LatestFurnaceIndex.from_store(store, lines)
+    publish_snapshots(index, broadcaster)
+    # SPC 运行统计，随新结果增量更新并保存到数据库
+    spc = SpcTracker.from_store(store)
+    broadcaster.publish_spc(spc.summary())
+    share = ReportShare(mirror_dir, share_timeout)
+
+    def on_new_results(updated, replaced):
+        """有新的检测结果时更新索引并推送，每天第一次更新时归档旧结果
+
+        replaced 为被更正的结果的旧记录：更正后的值不作为新样本加入 SPC 统计，而是重新计算受影响的统计。
+        """
+        nonlocal archived_on
+        if archived_on != time.strftime("%Y-%m-%d"):
+            archive_history(store)
+            archived_on = time.strftime("%Y-%m-%d")
+        print(f"新增或更新 {len(updated)} 条检测数据，发布炉组快照")
+        save_record_values(store, updated)
+        broadcaster.publish_updated({furnace_number for furnace_number, _, _ in updated})
+        if any([index.update(*item) for item in updated]):
+            publish_snapshots(index, broadcaster)
+        alarms = spc.update([item for item in updated if item[:2] not in replaced])
+        keys = set()  # 被更正的结果更正前后参与的统计
+        for furnace_number, test_number, record in updated:
+            old_record = replaced.get((furnace_number, test_number))
+            if old_record is not None:
+                keys |= record_keys(furnace_number, old_record) | record_keys(furnace_number, record)
+        if keys:
+            spc.rebuild(store, keys)
+        spc.save(store)
+        for alarm in alarms:
+            print(f"SPC 报警: 炉号 {alarm['炉号']}-{alarm['次数']} {alarm['字段']}={alarm['值']} {alarm['规则']}")
+        broadcaster.publish_spc(spc.summary())
+
+    def on_cycle():
+        """每轮检查派生指标配置，修改过时结果表中的值已按新公式重写，重新建立索引和 SPC 统计并推送"""
+        nonlocal index, spc
+        if not reload_derived(store):
+            return
+        index = LatestFurnaceIndex.from_store(store, lines)
+        publish_snapshots(index, broadcaster)
+        spc = SpcTracker.from_store(store)
+        broadcaster.publish_spc(spc.summary())
+
+    while True:
+        try:
+            print("运行 监视txt文件夹")
+            watch_folder(txtfolder_path, store, watch_interval, on_update=on_new_results,
+                         max_workers=max_share_connections, on_ready=broadcaster.publish_synced,
+                         share=share, max_backoff=max_share_backoff, on_cycle=on_cycle)
+        except Exception as e:
+            print(f"运行外部脚本出错: {e}")
+            metrics.log("error", error=str(e))
+            time.sleep(watch_interval)
+
+
+def serve():
+    """启动服务：先监听端口（端口被占用说明已有服务在运行，直接返回），再开始数据处理"""
+    broadcaster = Broadcaster()
+    try:
+        server = IngestServer((service_host, service_port), broadcaster)
+    except OSError as e:
+        print(f"端口 {service_host}:{service_port} 已被占用，数据处理服务可能已在运行: {e}")
+        return
+    # 启用指标日志，按需启动指标 HTTP 服务
+    setup_metrics_log(metrics_log_file)
+    if metrics_port:
+        serve_metrics(metrics_port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    threading.Thread(target=push_metrics, args=(broadcaster,), daemon=True).start()
+    print(f"数据处理服务已启动，监听 {service_host}:{service_port}")
+    run_ingestion(broadcaster)
+
+
+if __name__ == "__main__":
+    # 独立运行：python ingest_service.py；界面启动时连接不上也会自动启动
+    serve()
@@ -0,0 +1,47 @@
+import json
+import os
+
+# 炉组配置文件：每个炉组的编号、显示名称、炉号前缀、显示的炉次数量和输出文件
+LINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lines.json")
+# 配置文件不存在时使用的默认炉组（炉号第一位为炉组号）
+DEFAULT_LINES = [
+    {"id": str(i), "name": f"{i}#炉", "prefix": str(i), "window": 5, "output": f"data{i}.json"}
+    for i in (1, 2, 3)
+]
+
+
+class LineConfig:
+    """炉组定义：按配置顺序保存，炉号按最长前缀归属到炉组"""
+
+    def __init__(self, lines):
+        self.ids = [str(line["id"]) for line in lines]
+        self.names = {str(line["id"]): line.get("name", f"{line['id']}#炉") for line in lines}
+        self.prefixes = {str(line["id"]): str(line.get("prefix", line["id"])) for line in lines}
+        self.windows = {str(line["id"]): line.get("window", 5) for line in lines}
+        self.outputs = {str(line["id"]): line.get("output", f"data{line['id']}.json") for line in lines}
+        # 前缀按长度降序，先匹配更具体的前缀
+        self.by_prefix = sorted(((prefix, line_id) for line_id, prefix in self.prefixes.items()),
+                                key=lambda item: len(item[0]), reverse=True)
+
+    @classmethod
+    def load(cls, line_file=LINE_FILE):
+        """从配置文件加载，文件不存在时使用默认的三个炉组"""
+        if not os.path.exists(line_file):
+            return cls(DEFAULT_LINES)
+        with open(line_file, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["lines"])
+
+    def line_of(self, furnace_number):
+        """炉号所属的炉组号，不属于任何炉组时返回 None"""
+        for prefix, line_id in self.by_prefix:
+            if furnace_number.startswith(prefix):
+                return line_id
+        return None
+
+    def nested_prefixes(self, prefix):
+        """以 prefix 开头的其他更长前缀（属于别的炉组），按前缀范围查询某个炉组时需要排除"""
+        return [other for other in self.prefixes.values() if other != prefix and other.startswith(prefix)]
+
+
+# 默认炉组配置，程序启动时加载一次
+lines = LineConfig.load()
@@ -1,60 +1,124 @@
-import sys
-import threading
 import time
+# 记录启动时刻，用于测量冷启动耗时
+startup_started = time.perf_counter()
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtWidgets import QHeaderView
 # 从 PyQt5 库中导入所需的类，用于创建 GUI 界面
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QComboBox, QTableWidget, QTableWidgetItem, QMenu
-# 从 PyQt5 库中导入 QColor 类，用于设置颜色
-from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QComboBox, QTableView, QAbstractItemView, QMenu, \
+    QLineEdit
 # 从 PyQt5 库中导入 Qt 类和 QTimer 类，Qt 提供一些常量和枚举，QTimer 用于定时操作
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QObject, pyqtSignal
 # 从 data_processing 模块中导入所需的函数，用于数据处理
-from data_processing import process_folder, sotrjson, load_json_data, sort_furnace_tests
-
-# 目标 JSON 文件路径，存储处理后的数据
-json_files = ["data1.json", "data2.json", "data3.json"]
-# 自动刷新间隔时间，单位为秒
+from data_processing import load_json_data, sort_furnace_tests, load_snapshot_file, CYCLE_COUNTERS
+from data_store import ResultStore
+# 数据处理服务：界面只订阅服务推送的快照和事件，数据库、归档和快照文件的位置与服务相同
+from ingest_client import ServiceClient
+from ingest_service import snapshot_file, database_file, archive_dir
+# 历史查询面板
+from search_panel import SearchPanel
+# 导出列布局，复制到剪贴板时使用相同的布局
+from export import layout_values, format_value
+# 按页浏览数据库中的全部炉号
+from furnace_pager import FurnacePager
+# 表格模型，单元格颜色在模型中计算
+from table_model import FurnaceTableModel, HEADERS
+# 炉组配置（lines.json）：炉组号、名称、炉号前缀、显示的炉次数量和输出文件，界面为每个炉组创建一个面板
+from line_config import lines
+# 各阶段耗时和计数器
+from metrics import metrics
+
+# 冷启动耗时预算，单位为秒，超出时打印警告
+startup_budget = 1.5
+# 兜底刷新间隔时间，单位为秒（正常情况下由数据处理服务推送更新）
 refresh_interval = 120
-# 倒计时初始值，用于自动刷新倒计时显示
-countdown = refresh_interval
-# txt 文件所在的文件夹路径，需要替换为实际路径
-txtfolder_path = r"\\192.168.101.150\\cp"
-# 处理后的数据保存的 JSON 文件
-dataoutput_file = "data.json"
-
-def run_external_scripts():
-    """每 60 秒运行 readtxt.py，等待 3 秒后运行 sortjson.py"""
-    while True:
-        try:
-            print("运行 读取txt文件")
-            # 处理文件夹中的所有文件并保存结果
-            process_folder(txtfolder_path, dataoutput_file)  # 运行 readtxt.py
-
-            print("等待 3 秒...")
-            time.sleep(3)
-
-            print("运行整理json文件")
-            # 运行 sortjson.py
-            sotrjson()
-            print(f"等待 {refresh_interval} 秒后重新运行...")
-            # 等待指定的时间后再次执行循环
-            time.sleep(refresh_interval)
-        except Exception as e:
-            print(f"运行外部脚本出错: {e}")
+# 收到更新后合并刷新的等待时间，单位为毫秒，期间连续的更新只刷新一次
+refresh_debounce_ms = 200
+# 状态栏显示耗时的阶段
+status_stages = ["list_dir", "read_files", "parse", "regroup", "update_table"]
+# 每个炉组在界面上显示最近几条 SPC 报警
+spc_display_alarms = 3
+# 浏览更早的炉号时每页的炉号数量
+furnace_page_size = 50
+
+def row_record(model, row):
+    """表格中一行的原始值，按表头组成记录字典"""
+    return {header: model.value(row, col) for col, header in enumerate(HEADERS)}
+
+class SnapshotPublisher(QObject):
+    """接收线程通过信号把服务推送的炉组快照 {炉组号: {炉号: {检测次数: 记录}}}（只含有变化的炉组）
+    和有变化的炉组号集合转给界面，跨线程时由 Qt 排队到界面线程"""
+    published = pyqtSignal(object, object)
+    # 第一轮同步完成
+    synced = pyqtSignal()
+    # SPC 统计和最近的报警 {炉组号: {"stats": ..., "alarms": [...]}}
+    spc_published = pyqtSignal(object)
+    # 数据处理服务的各阶段耗时和计数器
+    metrics_published = pyqtSignal(object)
+    # 本轮新增或更正了结果的炉号列表（包括不在最新炉次中的更早炉号）
+    furnaces_updated = pyqtSignal(object)
+    # 与数据处理服务的连接状态
+    connection_changed = pyqtSignal(bool)
+
+def forward_message(publisher, message):
+    """把数据处理服务推送的消息转为信号（在接收线程中调用）"""
+    if message["type"] == "snapshots":
+        publisher.published.emit(message["snapshots"], set(message["changed"]))
+    elif message["type"] == "synced":
+        publisher.synced.emit()
+    elif message["type"] == "spc":
+        publisher.spc_published.emit(message["summary"])
+    elif message["type"] == "metrics":
+        publisher.metrics_published.emit(message["snapshot"])
+    elif message["type"] == "updated":
+        publisher.furnaces_updated.emit(message["furnaces"])
 
 class MainWindow(QWidget):
     def __init__(self):
         # 调用父类 QWidget 的构造函数
         super().__init__()
+        # 上次发布的快照（snapshot.json），没有时退回到各炉组的 JSON 文件
+        self.latest_snapshots = load_snapshot_file(snapshot_file)
+        # 浏览更早炉号用的数据库连接（第一次翻页时打开）、每个炉组的分页器，以及后台预取线程
+        self.browse_store = None
+        self.pagers = {}
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=1)
+        # 数据处理服务最近推送的指标
+        self.service_metrics = {"stages": {}, "counters": {}, "cycle": {}}
+        # 数据处理服务的订阅客户端（窗口显示后再连接）
+        self.client = None
         # 初始化界面
         self.initUI()
         # 启动自动刷新功能
         self.start_auto_refresh()
-        # 启动数据处理线程，使用 daemon=True 表示该线程为守护线程，主线程退出时该线程也会退出
-        script_thread = threading.Thread(target=run_external_scripts, daemon=True)
-        script_thread.start()
+        # 每秒刷新一次状态栏中的阶段耗时
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self.update_metrics_label)
+        self.metrics_timer.start(1000)
+        # 数据处理服务有更新时推送快照
+        self.publisher = SnapshotPublisher()
+        self.publisher.published.connect(self.on_snapshots)
+        self.publisher.synced.connect(lambda: self.sync_label.setText("已同步"))
+        self.publisher.spc_published.connect(self.on_spc)
+        self.publisher.metrics_published.connect(self.on_service_metrics)
+        self.publisher.furnaces_updated.connect(self.on_furnaces_updated)
+        self.publisher.connection_changed.connect(
+            lambda connected: self.sync_label.setText("同步中..." if connected else "未连接数据处理服务"))
         # 设置窗口的初始位置和大小
         self.setGeometry(500, 200, 1450, 1000)
+        # 窗口显示后再连接数据处理服务，不阻塞启动
+        QTimer.singleShot(0, self.start_ingestion)
+
+    def start_ingestion(self):
+        # 此时窗口已经显示，记录冷启动耗时
+        elapsed = time.perf_counter() - startup_started
+        print(f"启动耗时 {elapsed:.2f}s")
+        if elapsed > startup_budget:
+            print(f"⚠ 启动耗时超出预算 {startup_budget}s")
+        # 订阅数据处理服务（服务未运行时自动启动），多个界面共用一个服务，不会重复访问共享目录
+        self.client = ServiceClient(lambda message: forward_message(self.publisher, message),
+                                    self.publisher.connection_changed.emit)
+        self.client.start()
 
     def initUI(self):
         # 设置窗口的标题
@@ -68,11 +132,23 @@ class MainWindow(QWidget):
         self.comboboxes = []
         # 用于存储牌号标签控件的列表
         self.brand_labels = []
-
-        # 遍历目标 JSON 文件列表
-        for i, json_file in enumerate(json_files):
-            # 加载 JSON 文件中的数据
-            data = load_json_data(json_file)
+        # 用于存储每个炉组当前显示的数据
+        self.line_data = []
+        # 用于存储每个炉组的 SPC 报警标签
+        self.spc_labels = []
+        # 每个炉组当前浏览的页号（0 为最新炉次，1 起为数据库中更早的炉号）和页号标签
+        self.pages = []
+        self.page_labels = []
+
+        # 遍历配置的炉组，每个炉组一个面板
+        for i, line_id in enumerate(lines.ids):
+            if self.latest_snapshots is not None:
+                # 使用上次发布的快照
+                data = self.latest_snapshots.get(line_id, {})
+            else:
+                # 加载该炉组 JSON 文件中的数据
+                data = load_json_data(lines.outputs[line_id])
+            self.line_data.append(data)
 
             # 对炉号进行排序，如果有数据则按降序排列，否则为空列表
             furnace_ids = sorted(data.keys(), key=int, reverse=True) if data else []
@@ -85,7 +161,7 @@ class MainWindow(QWidget):
             top_layout = QHBoxLayout()
 
             # 创建一个标签，显示炉号编号
-            label = QLabel(f"{i + 1}#炉")
+            label = QLabel(lines.names[line_id])
             # 将标签添加到水平布局中
             top_layout.addWidget(label)
 
@@ -99,19 +175,43 @@ class MainWindow(QWidget):
             table = self.create_table()
             brand_label = self.create_brand_label()
 
-            # 修正 lambda 表达式中的变量捕获问题
-            combobox.currentTextChanged.connect(lambda text, t=table, d=data, l=brand_label: self.on_combobox_change(text, t, d, l))
+            # 修正 lambda 表达式中的变量捕获问题，数据按炉组序号取当前最新的
+            combobox.currentTextChanged.connect(lambda text, i=i, t=table, l=brand_label: self.on_combobox_change(text, t, self.furnace_data(i, text), l))
 
             # 将下拉框添加到水平布局中
             top_layout.addWidget(combobox)
             # 将下拉框添加到下拉框列表中
             self.comboboxes.append(combobox)
 
+            # 翻页按钮：浏览数据库中更早的炉号
+            older_button = QPushButton("◀ 更早")
+            older_button.clicked.connect(lambda _, i=i: self.show_page(i, self.pages[i] + 1))
+            newer_button = QPushButton("较新 ▶")
+            newer_button.clicked.connect(lambda _, i=i: self.show_page(i, self.pages[i] - 1))
+            page_label = QLabel("最新")
+            top_layout.addWidget(older_button)
+            top_layout.addWidget(newer_button)
+            top_layout.addWidget(page_label)
+            self.pages.append(0)
+            self.page_labels.append(page_label)
+
+            # 炉号输入框：输入任意炉号后回车直接显示
+            search_edit = QLineEdit()
+            search_edit.setPlaceholderText("输入炉号")
+            search_edit.setMaximumWidth(120)
+            search_edit.returnPressed.connect(lambda i=i, e=search_edit, t=table, l=brand_label: self.find_furnace(i, e.text().strip(), t, l))
+            top_layout.addWidget(search_edit)
+
             # 将牌号标签添加到水平布局中
             top_layout.addWidget(brand_label)
             # 将牌号标签添加到牌号标签列表中
             self.brand_labels.append(brand_label)
 
+            # 创建一个标签，显示该炉组最近的 SPC 报警，鼠标悬停时显示各牌号、元素的统计
+            spc_label = QLabel("SPC: --")
+            top_layout.addWidget(spc_label)
+            self.spc_labels.append(spc_label)
+
             # 将表格控件添加到表格列表中
             self.tables.append(table)
 
@@ -125,33 +225,46 @@ class MainWindow(QWidget):
             # 更新表格的数据和牌号标签的显示
             self.update_table(table, data, default_furnace, brand_label)
 
-        # 创建一个水平布局，用于管理刷新按钮和倒计时标签
+        # 创建一个水平布局，用于管理刷新按钮和更新时间标签
         refresh_layout = QHBoxLayout()
         # 创建一个刷新按钮
         refresh_button = QPushButton("刷新")
-        # 当刷新按钮被点击时，调用 refresh_data 方法刷新数据
-        refresh_button.clicked.connect(self.refresh_data)
-        # 创建一个倒计时标签，显示剩余的刷新时间
-        self.countdown_label = QLabel(f"刷新倒计时: {countdown}s")
+        # 当刷新按钮被点击时，重新获取最新状态并刷新
+        refresh_button.clicked.connect(self.request_refresh)
+        # 创建一个标签，显示最近一次刷新的时间
+        self.status_label = QLabel("最近更新: --")
         # 将刷新按钮添加到水平布局中
         refresh_layout.addWidget(refresh_button)
-        # 将倒计时标签添加到水平布局中
-        refresh_layout.addWidget(self.countdown_label)
+        # 将更新时间标签添加到水平布局中
+        refresh_layout.addWidget(self.status_label)
+        # 创建一个标签，显示后台同步状态，第一轮同步完成前显示“同步中”
+        self.sync_label = QLabel("同步中...")
+        refresh_layout.addWidget(self.sync_label)
+        # 创建一个标签，显示各阶段最近一次的耗时和文件计数
+        self.metrics_label = QLabel("")
+        refresh_layout.addWidget(self.metrics_label)
+        # 创建一个按钮，显示或隐藏历史查询面板
+        search_button = QPushButton("历史查询")
+        search_button.setCheckable(True)
+        refresh_layout.addWidget(search_button)
         # 将水平布局添加到主布局中
         main_layout.addLayout(refresh_layout)
 
+        # 历史查询面板，默认隐藏
+        self.search_panel = SearchPanel(self.create_table(), database_file, archive_dir)
+        self.search_panel.setVisible(False)
+        search_button.toggled.connect(self.search_panel.setVisible)
+        main_layout.addWidget(self.search_panel)
+
         # 将主布局设置为窗口的布局
         self.setLayout(main_layout)
 
     def create_table(self):
-        # 创建一个表格控件
-        table = QTableWidget()
-        # 设置表格的列数
-        table.setColumnCount(16)
-        # 设置表格的表头标签
-        table.setHorizontalHeaderLabels(["炉号", "次数", "Si", "Cu", "Mg", "Fe", "Zn", "Ni", "Mn", "Ti", "Sn", "Pb", "Cr", "Al", "污泥指数", "时间"])
+        # 创建一个表格视图，数据由 FurnaceTableModel 提供（表头即 HEADERS 的 16 列）
+        table = QTableView()
+        table.setModel(FurnaceTableModel(table))
         # 设置表格的选择模式为扩展选择，允许选择多行
-        table.setSelectionMode(QTableWidget.ExtendedSelection)
+        table.setSelectionMode(QAbstractItemView.ExtendedSelection)
         # 设置表格的上下文菜单策略为自定义，允许显示右键菜单
         table.setContextMenuPolicy(Qt.CustomContextMenu)
         # 当表格收到自定义上下文菜单请求时，调用 show_context_menu 方法显示右键菜单
@@ -169,7 +282,7 @@ class MainWindow(QWidget):
         table.verticalHeader().setDefaultSectionSize(35)
 
         # 可以单独设置每列的宽度，这里为了演示，统一设置列宽
-        for col in range(table.columnCount()):
+        for col in range(len(HEADERS)):
             table.setColumnWidth(col, 80)
         # 设置表格中时间列的宽度
         table.setColumnWidth(15, 200)
@@ -183,91 +296,144 @@ class MainWindow(QWidget):
         return QLabel("牌号：未知")
 
     def update_table(self, table, data, furnace_id, brand_label):
-        table.setRowCount(0)
+        with metrics.stage("update_table"):
+            self._update_table(table, data, furnace_id, brand_label)
+
+    def _update_table(self, table, data, furnace_id, brand_label):
+        records = []
         if furnace_id in data:
             sorted_tests = sort_furnace_tests(data[furnace_id].keys())  # 按规则排序
-            for test_num in sorted_tests:
-                values = data[furnace_id][test_num]
-                furnace_values = [furnace_id, test_num] + list(values.values())  # 组装数据
-
-                # 获取 `牌号` 和 `Fe` 值
-                brand = values.get("牌号", "")
-                fe_value = values.get("Fe", 0)
-                Pb_value = values.get("Pb", 0)                # 默认 0，避免 KeyError
-                Cu_value = values.get("Cu", 0) 
-                Si_value = values.get("Si", 0) 
-                Mn_value = values.get("Mn", 0) 
-                
-                row_position = table.rowCount()
-                table.insertRow(row_position)
-                for col, value in enumerate(furnace_values):
-                    item = QTableWidgetItem(str(value))
-                    # 设置表格内容居中显示
-                    item.setTextAlignment(Qt.AlignCenter)
-                    if brand == "ADC12Z" and col == 5:  # 仅对 Fe 列（索引为 5）设置颜色
-                        if 0.98 < fe_value < 1.00:
-                            item.setForeground(QColor(255, 165, 0))
-                        elif fe_value > 2.00:
-                            item.setForeground(Qt.red)
-                            
-                    if brand == "ADC12Z" and col == 11:  # 仅对 Pb 列（索引为 11）设置颜色
-                        if 0.09 < Pb_value <= 0.1:
-                            item.setForeground(QColor(255, 165, 0))
-                        elif Pb_value > 0.1:
-                            item.setForeground(Qt.red)
-                            
-                    if brand == "ADC12Z" and col == 3:  # 仅对 Cu 列（索引为 3）设置颜色
-                        if  Cu_value < 1.75 :
-                            item.setForeground(QColor(0, 0, 255)) #设为蓝色
-                        elif 1.75 <  Cu_value < 1.79 :
-                            item.setForeground(QColor(203, 71, 255))#设为紫色
-                        elif 2.3 > Cu_value > 2.0 :  
-                            item.setForeground(QColor(255, 165, 0))  
-                        elif Cu_value > 2.3 : 
-                            item.setForeground(Qt.red)   
-                    
-                    if brand == "ADC12Z" and col == 2:  # 仅对 Si 列（索引为 3）设置颜色
-                        if  Si_value < 10:
-                            item.setForeground(QColor(0, 0, 255)) #设为蓝色
-                        elif 10 <= Si_value < 10.2 :
-                            item.setForeground(QColor(203, 71, 255))#设为紫色
-                        elif 11.5 >= Si_value >= 11.2 :  
-                            item.setForeground(QColor(255, 165, 0))  
-                        elif Si_value > 11.5 : 
-                            item.setForeground(Qt.red) 
-                            
-                    if brand == "ADC12Z" and col == 8:  # 仅对 Mn 列（索引为 3）设置颜色
-                        if  Mn_value <= 0.2:
-                            item.setForeground(QColor(0, 0, 255)) #设为蓝色
-                        elif 0.2 < Mn_value < 0.22 :
-                            item.setForeground(QColor(203, 71, 255))#设为紫色
-                        elif 0.4 >= Mn_value >= 0.38 :  
-                            item.setForeground(QColor(255, 165, 0))  
-                        elif Mn_value > 0.4 : 
-                            item.setForeground(Qt.red) 
-                            
-                    table.setItem(row_position, col, item)
+            records = [(test_num, data[furnace_id][test_num]) for test_num in sorted_tests]
+        # 只把新增或变化的行通知给表格
+        table.model().set_records(furnace_id, records)
 
+        if furnace_id in data:
             # 更新牌号
             latest_test = max(data[furnace_id].keys(), key=str)
             brand = data[furnace_id][latest_test].get("牌号", "未知")
             brand_label.setText(f"牌号：{brand}")
 
+    def pager(self, i):
+        # 第 i 个炉组的分页器，第 1 页从最新炉次之后开始
+        line_id = lines.ids[i]
+        if line_id not in self.pagers:
+            if self.browse_store is None:
+                self.browse_store = ResultStore(database_file)
+            prefix = lines.prefixes[line_id]
+            self.pagers[line_id] = FurnacePager(self.browse_store, prefix, lines.windows[line_id],
+                                                furnace_page_size, self.prefetch_executor,
+                                                exclude=lines.nested_prefixes(prefix), archive_dir=archive_dir)
+        return self.pagers[line_id]
+
+    def furnace_data(self, i, furnace_id):
+        # 炉号的数据 {炉号: {检测次数: 记录}}：最新炉次取自快照，更早的炉号从数据库按需读取（有缓存）
+        if not furnace_id or furnace_id in self.line_data[i]:
+            return self.line_data[i]
+        records = self.pager(i).records(furnace_id)
+        return {furnace_id: records} if records else {}
+
+    def show_page(self, i, number):
+        # 切换第 i 个炉组的下拉框到第 number 页，0 为实时更新的最新炉次
+        if number <= 0:
+            self.pages[i] = 0
+            self.page_labels[i].setText("最新")
+            self.refresh_data({lines.ids[i]})
+            return
+        furnace_ids = self.pager(i).page(number)
+        if not furnace_ids:
+            return  # 没有更早的炉号了
+        self.pages[i] = number
+        self.page_labels[i].setText(f"第 {number} 页")
+        combobox = self.comboboxes[i]
+        combobox.blockSignals(True)
+        combobox.clear()
+        combobox.addItems(furnace_ids)
+        combobox.setCurrentIndex(0)
+        combobox.blockSignals(False)
+        self.update_table(self.tables[i], self.furnace_data(i, furnace_ids[0]), furnace_ids[0], self.brand_labels[i])
+
+    def find_furnace(self, i, furnace_id, table, brand_label):
+        # 直接显示输入的炉号（可以是任何时期的炉号）
+        if not furnace_id:
+            return
+        if lines.line_of(furnace_id) != lines.ids[i]:
+            brand_label.setText(f"炉号 {furnace_id} 不属于{lines.names[lines.ids[i]]}")
+            return
+        data = self.furnace_data(i, furnace_id)
+        if furnace_id not in data:
+            brand_label.setText(f"未找到炉号 {furnace_id}")
+            return
+        if furnace_id in self.line_data[i]:
+            # 最新炉次：回到实时页
+            if self.pages[i] > 0:
+                self.show_page(i, 0)
+        else:
+            # 更早的炉号：与翻页一样切换到它所在的页，之后的刷新不会覆盖选中的炉号
+            number = max(1, self.pager(i).page_of(furnace_id))
+            self.show_page(i, number)
+            self.pages[i] = number
+            self.page_labels[i].setText(f"第 {number} 页")
+        combobox = self.comboboxes[i]
+        combobox.blockSignals(True)
+        if combobox.findText(furnace_id) < 0:
+            combobox.addItem(furnace_id)
+        combobox.setCurrentText(furnace_id)
+        combobox.blockSignals(False)
+        self.update_table(table, data, furnace_id, brand_label)
+
     def on_combobox_change(self, selected_furnace, table, data, brand_label):
         # 当下拉框的选中项改变时，更新表格的数据和牌号标签的显示
         self.update_table(table, data, selected_furnace, brand_label)
 
-    def refresh_data(self):
-        global countdown
-        # 重置倒计时为初始值
-        countdown = refresh_interval
-        # 更新倒计时标签的显示
-        self.update_countdown()
-
-        # 遍历目标 JSON 文件列表
-        for i, json_file in enumerate(json_files):
-            # 加载 JSON 文件中的数据
-            data = load_json_data(json_file)
+    def refresh_data(self, line_ids=None):
+        # line_ids 为 None 时刷新全部炉组，否则只刷新其中的炉组
+        with metrics.stage("refresh"):
+            self._refresh_data(line_ids)
+        self.update_metrics_label()
+
+    def refresh_dirty_lines(self):
+        # 只刷新收到更新的炉组
+        dirty_lines, self.dirty_lines = self.dirty_lines, set()
+        self.refresh_data(dirty_lines)
+
+    def update_metrics_label(self):
+        # 显示各阶段最近一次的耗时（毫秒）和最近一轮同步的文件数，界面的阶段取本进程的指标，其余取数据处理服务推送的指标
+        parts = []
+        for name in status_stages:
+            seconds = metrics.last(name)
+            if seconds is None and name in self.service_metrics["stages"]:
+                seconds = self.service_metrics["stages"][name]["last"]
+            if seconds is not None:
+                parts.append(f"{name} {seconds * 1000:.0f}ms")
+        cycle = self.service_metrics.get("cycle", {})
+        for name in CYCLE_COUNTERS:
+            if name in cycle:
+                parts.append(f"{name} {cycle[name]}")
+        self.metrics_label.setText("  ".join(parts))
+
+    def _refresh_data(self, line_ids=None):
+        # 更新刷新时间标签的显示
+        self.status_label.setText(f"最近更新: {time.strftime('%H:%M:%S')}")
+
+        # 遍历配置的炉组
+        for i, line_id in enumerate(lines.ids):
+            if line_ids is not None and line_id not in line_ids:
+                continue
+            if self.latest_snapshots is not None:
+                # 使用数据处理服务推送的内存快照，不再读取文件
+                data = self.latest_snapshots.get(line_id, {})
+            else:
+                # 加载该炉组 JSON 文件中的数据
+                data = load_json_data(lines.outputs[line_id])
+            previous, self.line_data[i] = self.line_data[i], data
+            if line_id in self.pagers:
+                pager = self.pagers[line_id]
+                if set(data) != set(previous):
+                    # 有新炉号时更早炉号的分页位置会变化
+                    pager.invalidate_pages()
+                pager.evict([furnace for furnace, tests in data.items() if previous.get(furnace) != tests])
+            if self.pages[i] > 0:
+                continue  # 正在浏览更早的炉号，不切换
             # 获取对应的下拉框控件
             combobox = self.comboboxes[i]
             # 获取对应的牌号标签控件
@@ -278,64 +444,107 @@ class MainWindow(QWidget):
             # 获取默认的炉号，如果有数据则取第一个，否则为空字符串
             default_furnace = furnace_ids[0] if furnace_ids else ""
 
-            # 清空下拉框中的选项
-            combobox.clear()
-            # 向下拉框中添加炉号选项
-            combobox.addItems(furnace_ids)
-            # 设置下拉框的默认选中项
-            combobox.setCurrentText(default_furnace)
+            current_ids = [combobox.itemText(index) for index in range(combobox.count())]
+            if furnace_ids != current_ids:
+                # 炉号列表有变化（如出现新炉号）时才重建下拉框，并切换到最新炉号
+                combobox.blockSignals(True)
+                # 清空下拉框中的选项
+                combobox.clear()
+                # 向下拉框中添加炉号选项
+                combobox.addItems(furnace_ids)
+                # 设置下拉框的默认选中项
+                combobox.setCurrentText(default_furnace)
+                combobox.blockSignals(False)
+            selected_furnace = combobox.currentText()
 
             # 获取对应的表格控件
             table = self.tables[i]
-            # 更新表格的数据和牌号标签的显示
-            self.update_table(table, data, default_furnace, brand_label)
+            # 更新表格的数据和牌号标签的显示，保留用户当前选中的炉号
+            self.update_table(table, data, selected_furnace, brand_label)
 
     def start_auto_refresh(self):
-        # 创建一个定时器
+        # 合并刷新用的单次定时器：收到更新后等待 refresh_debounce_ms 再刷新，期间的更新合并为一次
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(refresh_debounce_ms)
+        self.debounce_timer.timeout.connect(self.refresh_dirty_lines)
+        # 收到更新、等待刷新的炉组
+        self.dirty_lines = set()
+        # 兜底定时器：每隔 refresh_interval 秒重新获取最新状态并刷新全部炉组，防止漏掉推送
         self.timer = QTimer(self)
-        # 当定时器超时（每秒触发一次）时，调用 auto_refresh 方法
-        self.timer.timeout.connect(self.auto_refresh)
-        # 启动定时器，每隔 1000 毫秒（即 1 秒）触发一次
-        self.timer.start(1000)
-
-    def auto_refresh(self):
-        global countdown
-        if countdown > 0:
-            # 倒计时减 1
-            countdown -= 1
-            # 更新倒计时标签的显示
-            self.update_countdown()
-        else:
-            # 倒计时结束，刷新数据
-            self.refresh_data()
-
-    def update_countdown(self):
-        # 更新倒计时标签的显示，显示剩余的刷新时间
-        self.countdown_label.setText(f"刷新倒计时: {countdown}s")
+        self.timer.timeout.connect(self.request_refresh)
+        self.timer.start(refresh_interval * 1000)
+
+    def request_refresh(self):
+        # 手动刷新和兜底刷新：请求数据处理服务重新发送完整状态（收到后按推送合并刷新）；
+        # 未连接服务时改为重新读取服务原子写出的快照文件
+        if self.client is None or not self.client.request_state():
+            snapshots = load_snapshot_file(snapshot_file)
+            if snapshots is not None:
+                self.latest_snapshots = snapshots
+        self.refresh_data()
+
+    def on_snapshots(self, snapshots, changed):
+        # 数据处理服务推送了有变化的炉组快照，合并到最新快照中，合并刷新有变化的炉组
+        self.latest_snapshots = {**(self.latest_snapshots or {}), **snapshots}
+        self.dirty_lines |= changed
+        if not self.debounce_timer.isActive():
+            self.debounce_timer.start()
+
+    def on_furnaces_updated(self, furnaces):
+        # 有结果变化的炉号：丢弃分页器中缓存的记录；不在已缓存页中的炉号可能是新炉号，页的位置会变化
+        for furnace_number in furnaces:
+            line_id = lines.line_of(furnace_number)
+            pager = self.pagers.get(line_id)
+            if pager is None:
+                continue
+            pager.evict([furnace_number])
+            if furnace_number not in self.line_data[lines.ids.index(line_id)] and not pager.cached_in_pages(furnace_number):
+                pager.invalidate_pages()
+
+    def on_service_metrics(self, snapshot):
+        # 数据处理服务推送的指标，由每秒的状态栏刷新显示
+        self.service_metrics = snapshot
+
+    def on_spc(self, summary):
+        # 数据处理服务推送了新的 SPC 统计，只更新报警标签，不刷新表格
+        for i, line_id in enumerate(lines.ids):
+            line = summary.get(line_id, {"stats": {}, "alarms": []})
+            alarms = line["alarms"][-spc_display_alarms:]
+            spc_label = self.spc_labels[i]
+            if alarms:
+                spc_label.setText("SPC: " + "  ".join(
+                    f"{alarm['炉号']}-{alarm['次数']} {alarm['字段']} {alarm['规则']}" for alarm in reversed(alarms)))
+                spc_label.setStyleSheet("color: red")
+            else:
+                spc_label.setText("SPC: 正常")
+                spc_label.setStyleSheet("")
+            spc_label.setToolTip("\n".join(
+                f"{brand} {field}: 均值 {stats['mean']:.4f}  σ {stats['std']:.4f}  "
+                f"控制限 [{stats['lcl']:.4f}, {stats['ucl']:.4f}]  EWMA {stats['ewma']:.4f}  n={stats['n']}"
+                for (brand, field), stats in sorted(line["stats"].items())
+            ))
 
     def copy_selected_rows(self, table, event):
         # 检查 event 是否为 None，如果为 None 则直接执行复制操作；如果不为 None 则检查是否按下了 Ctrl+C 组合键
         if event is None or (event.key() == Qt.Key_C and (event.modifiers() & Qt.ControlModifier)):
-            # 获取表格中选中的所有项
-            selected_items = table.selectedItems()
-            if not selected_items:
+            # 获取表格中选中的所有单元格
+            selected_indexes = table.selectionModel().selectedIndexes()
+            if not selected_indexes:
                 return
 
             # 获取选中项所在的行号，并进行排序
-            rows = sorted(set(item.row() for item in selected_items))
-            # 需要复制的列名
-            columns = ["Si", "Cu", "Mg", "Fe", "Zn", "Ni", "Mn", "Ti", "Sn", "Pb", "Al"]
-            # 获取需要复制的列的索引
-            column_indexes = [table.horizontalHeaderItem(i).text() in columns for i in range(table.columnCount())]
+            rows = sorted(set(index.row() for index in selected_indexes))
+            model = table.model()
 
             # 用于存储复制的数据
             copied_data = []
             # 遍历选中的行
             for row in rows:
-                # 获取该行中需要复制的列的数据
-                copied_values = [table.item(row, i).text() for i, col in enumerate(column_indexes) if col]
+                # 按 ADC12Z 布局取该行需要复制的列（与批量导出相同）
+                copied_values = layout_values("ADC12Z", row_record(model, row))
                 # 将数据用制表符连接成字符串，并添加到复制数据列表中
-                copied_data.append("\t".join(copied_values))
+                copied_data.append("\t".join(map(format_value, copied_values)))
 
             # 将复制的数据用换行符连接成字符串
             clipboard_text = "\n".join(copied_data)
@@ -356,28 +565,21 @@ class MainWindow(QWidget):
         context_menu.exec_(table.mapToGlobal(pos))
 
     def copy_selected_rows_alsi10(self, table):
-        # 获取表格中选中的所有项
-        selected_items = table.selectedItems()
-        if not selected_items:
+        # 获取表格中选中的所有单元格
+        selected_indexes = table.selectionModel().selectedIndexes()
+        if not selected_indexes:
             return
 
         # 获取选中项所在的行号，并进行排序
-        rows = sorted(set(item.row() for item in selected_items))
-        # 需要复制的列名
-        columns = ["Si", "Cu", "Mg", "Fe", "Zn", "Ni", "Mn", "Ti", "Sn", "Al"]
-        # 获取需要复制的列的索引
-        column_indexes = [table.horizontalHeaderItem(i).text() in columns for i in range(table.columnCount())]
+        rows = sorted(set(index.row() for index in selected_indexes))
+        model = table.model()
 
         # 用于存储复制的数据
         copied_data = []
         # 遍历选中的行
         for row in rows:
-            # 获取该行中需要复制的列的数据，并转换为浮点数
-            row_values = [float(table.item(row, i).text()) for i, col in enumerate(column_indexes) if col]
-            # 计算 100 减去所有元素值的和，并保留 4 位小数
-            calculated_value = round(100 - sum(row_values), 4)
-            # 将计算结果插入到数据列表中
-            copied_values = row_values[:-1] + [calculated_value, row_values[-1]]
+            # 按 ALSI10 布局取该行的原始数值，缺失的元素按 0 处理，并插入 100 减去所有元素值之和的余量列
+            copied_values = layout_values("ALSI10", row_record(model, row))
             # 将数据用制表符连接成字符串，并添加到复制数据列表中
             copied_data.append("\t".join(map(str, copied_values)))
 
@@ -0,0 +1,115 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+
+# 结构化日志（每行一个 JSON），按大小轮转
+logger = logging.getLogger("pipeline.metrics")
+
+
+class PipelineMetrics:
+    """各阶段耗时和计数器，供数据处理线程和界面线程共同使用"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}  # {阶段: {"count", "total", "last", "max"}}，单位为秒
+        self.counters = {}  # {计数器: 累计值}
+        self.cycle = {}  # {计数器: 最近一轮的增量}，供界面显示
+
+    @contextmanager
+    def stage(self, name):
+        """记录一个阶段的耗时：with metrics.stage("parse"): ..."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        with self.lock:
+            stats = self.stages.setdefault(name, {"count": 0, "total": 0.0, "last": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["total"] += seconds
+            stats["last"] = seconds
+            stats["max"] = max(stats["max"], seconds)
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def counter_values(self, names):
+        """若干计数器的当前累计值 {计数器: 值}"""
+        with self.lock:
+            return {name: self.counters.get(name, 0) for name in names}
+
+    def set_cycle(self, before):
+        """记录最近一轮的增量：before 为本轮开始时 counter_values 的结果"""
+        after = self.counter_values(before)
+        with self.lock:
+            self.cycle = {name: after[name] - value for name, value in before.items()}
+
+    def snapshot(self):
+        """当前全部指标的副本"""
+        with self.lock:
+            return {
+                "stages": {name: dict(stats) for name, stats in self.stages.items()},
+                "counters": dict(self.counters),
+                "cycle": dict(self.cycle),
+            }
+
+    def last(self, name):
+        """某阶段最近一次的耗时，没有记录时返回 None"""
+        with self.lock:
+            stats = self.stages.get(name)
+            return stats["last"] if stats else None
+
+    def log(self, event, **fields):
+        """写一条结构化日志，附带当前指标"""
+        logger.info(json.dumps({
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "event": event,
+            **fields,
+            **self.snapshot(),
+        }, ensure_ascii=False))
+
+
+# 全局指标，数据处理和界面共用
+metrics = PipelineMetrics()
+
+
+def setup_metrics_log(log_file="metrics.log", max_bytes=1024 * 1024, backup_count=5):
+    """把结构化日志写到按大小轮转的文件"""
+    handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return handler
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics 返回 JSON 格式的当前指标"""
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = json.dumps(metrics.snapshot(), ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 不打印访问日志
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """在后台线程启动本机的指标 HTTP 服务，返回服务器对象"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
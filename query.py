@@ -0,0 +1,107 @@
+import argparse
+from datetime import datetime
+
+from archive import DEFAULT_ARCHIVE_DIR, archived_months, load_partition_history, read_partition, month_start, next_month
+from data_processing import elements
+from data_store import DEFAULT_DB_FILE, ResultStore
+from history_store import ColumnarHistory
+from line_config import lines
+
+
+def time_bounds(start=None, end=None):
+    """datetime 时间段 [start, end] 转为时间戳范围 [start_ts, end_ts)，为 None 表示不限"""
+    start_ts = int(start.timestamp()) if start else None
+    end_ts = int(end.timestamp()) + 1 if end else None
+    return start_ts, end_ts
+
+
+def search(store, brand=None, start=None, end=None, line=None, ranges=None, limit=None, archive_dir=DEFAULT_ARCHIVE_DIR):
+    """查询全部历史（数据库以及与时间段重叠的归档分区），返回按时间倒序的 [(炉号, 检测次数, 记录)]
+
+    start/end 为 datetime（包含两端），为 None 表示不限；其余条件见 ResultStore.query。
+    数据库中的结果比归档的新，数据库已经满足 limit 条时不再读取归档。
+    """
+    start_ts, end_ts = time_bounds(start, end)
+    results = store.query(brand, start_ts, end_ts, line, ranges, limit)
+    if limit is not None and len(results) >= limit:
+        return results
+
+    archived = []
+    for year, month in archived_months(archive_dir):
+        if start_ts is not None and month_start(*next_month(year, month)) <= start_ts:
+            continue
+        if end_ts is not None and month_start(year, month) >= end_ts:
+            continue
+        history = load_partition_history(year, month, archive_dir)
+        archived += history.rows(history.mask_query(brand, start_ts, end_ts, line, ranges))
+    archived.sort(key=lambda item: item[2].get("time") or "", reverse=True)
+    results += archived
+    return results if limit is None else results[:limit]
+
+
+def iter_results(store, brand=None, start=None, end=None, line=None, ranges=None, archive_dir=DEFAULT_ARCHIVE_DIR, chunk_size=1000):
+    """按条件分块读取全部历史，按时间正序逐块返回 [(炉号, 检测次数, 记录)]，条件含义与 search 相同
+
+    先逐月读取与时间段重叠的归档分区（不放入缓存），再分块读取数据库，任何时候只在内存中保留一个分区或一块结果。
+    """
+    start_ts, end_ts = time_bounds(start, end)
+    for year, month in archived_months(archive_dir):
+        if start_ts is not None and month_start(*next_month(year, month)) <= start_ts:
+            continue
+        if end_ts is not None and month_start(year, month) >= end_ts:
+            continue
+        history = ColumnarHistory.from_dict(read_partition(year, month, archive_dir))
+        archived = history.rows(history.mask_query(brand, start_ts, end_ts, line, ranges))
+        archived.sort(key=lambda item: (item[2].get("time") or "", item[0], item[1]))
+        for i in range(0, len(archived), chunk_size):
+            yield archived[i:i + chunk_size]
+    yield from store.iter_query(brand, start_ts, end_ts, line, ranges, chunk_size)
+
+
+def query_ranges(minimums, maximums):
+    """命令行的 --min/--max 列表 [(字段, 值)] 合并为 {字段: (下限, 上限)}"""
+    ranges = {}
+    for field, value in minimums:
+        ranges[field] = (value, ranges.get(field, (None, None))[1])
+    for field, value in maximums:
+        ranges[field] = (ranges.get(field, (None, None))[0], value)
+    return ranges
+
+
+def add_query_arguments(parser):
+    """命令行中的查询条件参数，query.py 和 export.py 共用"""
+    parser.add_argument("--brand", help="牌号，不区分大小写")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="开始时间，如 2025-01-01 或 '2025-01-01 08:00:00'")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="结束时间（包含）")
+    parser.add_argument("--line", choices=lines.ids, help="炉组号，如 1")
+    parser.add_argument("--min", action="append", default=[], type=parse_bound, metavar="元素=值",
+                        help="下限（包含），可以重复，如 --min Si=9.6；污泥指数写作 污泥指数=1.8")
+    parser.add_argument("--max", action="append", default=[], type=parse_bound, metavar="元素=值",
+                        help="上限（包含），可以重复，如 --max Fe=0.9")
+    parser.add_argument("--db", default=DEFAULT_DB_FILE)
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE_DIR)
+
+
+def parse_bound(text):
+    """解析命令行中的 "元素=值"，返回 (元素, 值)"""
+    field, _, value = text.partition("=")
+    return field, float(value)
+
+
+if __name__ == "__main__":
+    # 命令行：按条件查询全部历史，结果以制表符分隔输出
+    parser = argparse.ArgumentParser(description="检测结果查询")
+    add_query_arguments(parser)
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    store = ResultStore(args.db)
+    ranges = query_ranges(args.min, args.max)
+    results = search(store, args.brand, args.start, args.end, args.line, ranges, args.limit, args.archive)
+    columns = [*elements, "污泥指数"]
+    print("\t".join(["炉号", "次数", "牌号", "时间", *columns]))
+    for furnace_number, test_number, record in results:
+        values = ["" if record.get(column) is None else str(record[column]) for column in columns]
+        print("\t".join([furnace_number, test_number, record.get("牌号") or "", record.get("time") or "", *values]))
+    print(f"共 {len(results)} 条")
+    store.close()
@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+
+from PyQt5.QtCore import QDateTime
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QLineEdit, QPushButton, QDateTimeEdit, \
+    QFileDialog
+
+from data_processing import brands, elements
+from data_store import ResultStore
+from export import LAYOUTS, export_results
+from line_config import lines
+from query import search
+
+# 查询结果最多显示的条数
+SEARCH_LIMIT = 1000
+# 默认查询最近多少天
+DEFAULT_DAYS = 30
+
+
+class SearchPanel(QWidget):
+    """历史查询面板：按牌号、炉组、时间段、元素或污泥指数范围查询全部历史（含归档）"""
+
+    def __init__(self, table, db_file, archive_dir, parent=None):
+        super().__init__(parent)
+        # 查询结果表格由主窗口创建，复制和右键菜单与炉组表格相同
+        self.table = table
+        self.db_file = db_file
+        self.archive_dir = archive_dir
+        self.store = None  # 第一次查询时打开，只读访问数据处理服务写入的数据库
+
+        # 条件：牌号、炉组
+        self.brand_box = QComboBox()
+        self.brand_box.setEditable(True)
+        self.brand_box.addItems(["", *brands])
+        self.line_box = QComboBox()
+        self.line_box.addItem("全部", None)
+        for line_id in lines.ids:
+            self.line_box.addItem(lines.names[line_id], line_id)
+
+        # 条件：时间段，默认最近 DEFAULT_DAYS 天；结束时间没有修改过时不限（查询到当前为止）
+        now = datetime.now()
+        self.start_edit = QDateTimeEdit(QDateTime(now - timedelta(days=DEFAULT_DAYS)))
+        self.end_edit = QDateTimeEdit(QDateTime(now))
+        for edit in (self.start_edit, self.end_edit):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("yyyy-MM-dd HH:mm")
+        self.end_edited = False
+        self.end_edit.dateTimeChanged.connect(self.on_end_edited)
+
+        # 条件：某个元素或污泥指数的范围，留空表示不限
+        self.field_box = QComboBox()
+        self.field_box.addItems([*elements, "污泥指数"])
+        self.low_edit = QLineEdit()
+        self.low_edit.setPlaceholderText("下限")
+        self.high_edit = QLineEdit()
+        self.high_edit.setPlaceholderText("上限")
+
+        search_button = QPushButton("查询")
+        search_button.clicked.connect(self.run_search)
+        # 按当前条件导出全部结果（不受显示条数限制）
+        self.layout_box = QComboBox()
+        self.layout_box.addItems(list(LAYOUTS))
+        export_button = QPushButton("导出")
+        export_button.clicked.connect(self.run_export)
+        self.result_label = QLabel("")
+
+        condition_layout = QHBoxLayout()
+        for widget in (QLabel("牌号"), self.brand_box, QLabel("炉组"), self.line_box,
+                       QLabel("从"), self.start_edit, QLabel("到"), self.end_edit,
+                       self.field_box, self.low_edit, self.high_edit, search_button,
+                       self.layout_box, export_button, self.result_label):
+            condition_layout.addWidget(widget)
+
+        layout = QVBoxLayout()
+        layout.addLayout(condition_layout)
+        layout.addWidget(table)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+
+    def on_end_edited(self):
+        self.end_edited = True
+
+    def end_time(self):
+        """结束时间：用户修改过时取界面上的值；否则不限，并把显示更新为当前时间"""
+        if self.end_edited:
+            return self.end_edit.dateTime().toPyDateTime()
+        self.end_edit.blockSignals(True)
+        self.end_edit.setDateTime(QDateTime(datetime.now()))
+        self.end_edit.blockSignals(False)
+        return None
+
+    def conditions(self):
+        """读取界面上的查询条件，返回 search() 的关键字参数；数值填写错误时抛出 ValueError"""
+        low, high = self.low_edit.text().strip(), self.high_edit.text().strip()
+        ranges = {}
+        if low or high:
+            ranges[self.field_box.currentText()] = (float(low) if low else None, float(high) if high else None)
+        return {
+            "brand": self.brand_box.currentText().strip() or None,
+            "start": self.start_edit.dateTime().toPyDateTime(),
+            "end": self.end_time(),
+            "line": self.line_box.currentData(),  # 炉组号，炉号按最长前缀归属
+            "ranges": ranges,
+        }
+
+    def open_store(self):
+        if self.store is None:
+            self.store = ResultStore(self.db_file)
+        return self.store
+
+    def run_search(self):
+        try:
+            conditions = self.conditions()
+        except ValueError:
+            self.result_label.setText("上下限必须是数字")
+            return
+        self.open_store()
+        results = search(self.store, limit=SEARCH_LIMIT, archive_dir=self.archive_dir, **conditions)
+        self.table.model().set_results(results)
+        suffix = f"（只显示最新 {SEARCH_LIMIT} 条）" if len(results) >= SEARCH_LIMIT else ""
+        self.result_label.setText(f"共 {len(results)} 条{suffix}")
+
+    def run_export(self):
+        try:
+            conditions = self.conditions()
+        except ValueError:
+            self.result_label.setText("上下限必须是数字")
+            return
+        output_file, _ = QFileDialog.getSaveFileName(self, "导出", "", "CSV 文件 (*.csv);;列式文件 (*.npz)")
+        if not output_file:
+            return
+        count = export_results(self.open_store(), output_file, self.layout_box.currentText(),
+                               archive_dir=self.archive_dir, **conditions)
+        self.result_label.setText(f"已导出 {count} 条到 {output_file}")
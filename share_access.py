@@ -0,0 +1,87 @@
+import os
+import threading
+
+from data_processing import list_reports, read_file_content, get_file_creation_time
+
+# 本地镜像目录：从共享目录读取过的报告按原文件名保存，修改时间与共享目录一致
+DEFAULT_MIRROR_DIR = "mirror"
+# 每次访问共享目录（列目录、读取一个文件）的超时时间，单位为秒
+DEFAULT_TIMEOUT = 10
+
+
+class ShareTimeout(TimeoutError):
+    """访问共享目录超时"""
+
+
+def call_with_timeout(func, *args, timeout=DEFAULT_TIMEOUT):
+    """在守护线程中调用 func(*args)，超过 timeout 秒抛出 ShareTimeout
+
+    共享目录卡死时阻塞的只是这个守护线程，调用方可以按时返回并退避重试；
+    卡住的线程不会阻止程序退出。
+    """
+    result = {}
+
+    def target():
+        try:
+            result["value"] = func(*args)
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise ShareTimeout(f"访问共享目录超时（{timeout}s）: {getattr(func, '__name__', func)}{args}")
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+def read_file_bytes(file_path):
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+class ReportShare:
+    """带超时和本地镜像的共享目录访问，传给 data_processing.sync_folder 使用
+
+    列目录和读取文件都有超时；读取的报告先复制到 mirror_dir 再从本地解析，
+    本地副本的大小和修改时间与共享目录一致时不再访问共享目录读取内容。
+    镜像目录本身就是一个报告文件夹，重新解析时可以直接对它运行 process_folder / sync_folder。
+    lister、stat、reader 为访问共享目录的函数（列目录、取文件状态、读取文件内容），
+    可以替换为模拟卡死或出错的函数，见 benchmarks/simulate_share.py。
+    """
+
+    def __init__(self, mirror_dir=DEFAULT_MIRROR_DIR, timeout=DEFAULT_TIMEOUT,
+                 lister=list_reports, stat=os.stat, reader=read_file_bytes):
+        self.mirror_dir = mirror_dir
+        self.timeout = timeout
+        self.lister = lister
+        self.stat = stat
+        self.reader = reader
+        os.makedirs(mirror_dir, exist_ok=True)
+
+    def list_reports(self, folder_path):
+        """列出共享目录中的 txt 文件 [(文件名, [大小, 修改时间])]"""
+        return call_with_timeout(self.lister, folder_path, timeout=self.timeout)
+
+    def mirror(self, file_path):
+        """确保报告的本地副本是最新的，返回本地路径"""
+        local_path = os.path.join(self.mirror_dir, os.path.basename(file_path))
+        stat = call_with_timeout(self.stat, file_path, timeout=self.timeout)
+        if os.path.exists(local_path):
+            local = os.stat(local_path)
+            if local.st_size == stat.st_size and local.st_mtime_ns == stat.st_mtime_ns:
+                return local_path
+
+        content = call_with_timeout(self.reader, file_path, timeout=self.timeout)
+        with open(local_path + ".tmp", "wb") as f:
+            f.write(content)
+        os.utime(local_path + ".tmp", ns=(stat.st_atime_ns, stat.st_mtime_ns))  # 保留共享目录中的修改时间（即报告时间）
+        os.replace(local_path + ".tmp", local_path)
+        return local_path
+
+    def fetch(self, file_path):
+        """读取报告原文和保存时间（与 data_processing.fetch_report 相同），内容来自本地副本"""
+        local_path = self.mirror(file_path)
+        return read_file_content(local_path), get_file_creation_time(local_path)
@@ -0,0 +1,193 @@
+import math
+from collections import deque
+
+from data_processing import elements
+from line_config import lines
+
+# 参与统计的字段：各元素含量和污泥指数
+SPC_FIELDS = [*elements, "污泥指数"]
+# EWMA 平滑系数
+EWMA_LAMBDA = 0.2
+# 控制限为均值 ± SIGMA_LIMIT 倍标准差
+SIGMA_LIMIT = 3
+# 连续多少个点在均值同一侧时报警
+RUN_LENGTH = 7
+# 样本数达到多少后才判定报警（样本太少时控制限不可靠）
+MIN_SAMPLES = 20
+# 每个炉组保留最近的报警条数
+RECENT_ALARMS = 20
+# 没有牌号的记录统计在该牌号下
+UNKNOWN_BRAND = "未知"
+
+
+def brand_of(record):
+    """记录在统计中的牌号（大写）"""
+    return (record.get("牌号") or UNKNOWN_BRAND).upper()
+
+
+def record_keys(furnace_number, record):
+    """一条记录参与的统计键 {(炉组, 牌号, 字段)}"""
+    line_id = lines.line_of(furnace_number)
+    if line_id is None:
+        return set()
+    brand = brand_of(record)
+    return {(line_id, brand, field) for field in SPC_FIELDS if record.get(field) is not None}
+
+
+class RunningStats:
+    """一个（炉组、牌号、字段）的运行统计，每个新值 O(1) 更新
+
+    均值和方差按 Welford 算法累积，同时维护 EWMA 和当前游程（连续在均值同一侧的点数）。
+    """
+
+    __slots__ = ("n", "mean", "m2", "ewma", "run_side", "run_length")
+
+    def __init__(self, n=0, mean=0.0, m2=0.0, ewma=None, run_side=0, run_length=0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+        self.ewma = ewma
+        self.run_side = run_side  # 1 为高于均值，-1 为低于均值
+        self.run_length = run_length
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def limits(self):
+        """单值控制限 (下限, 上限)"""
+        return self.mean - SIGMA_LIMIT * self.std, self.mean + SIGMA_LIMIT * self.std
+
+    def ewma_limits(self):
+        """EWMA 控制限 (下限, 上限)（稳态）"""
+        width = SIGMA_LIMIT * self.std * math.sqrt(EWMA_LAMBDA / (2 - EWMA_LAMBDA))
+        return self.mean - width, self.mean + width
+
+    def update(self, value):
+        """加入一个新值，返回触发的报警规则列表（按加入前的统计判定）"""
+        alarms = []
+        if self.n >= MIN_SAMPLES and self.std > 0:
+            low, high = self.limits()
+            if not low <= value <= high:
+                alarms.append(f"超出{SIGMA_LIMIT}σ")
+
+        side = (value > self.mean) - (value < self.mean) if self.n else 0
+        if side and side == self.run_side:
+            self.run_length += 1
+        else:
+            self.run_side, self.run_length = side, 1 if side else 0
+        if self.n >= MIN_SAMPLES and self.run_length == RUN_LENGTH:
+            alarms.append(f"连续{RUN_LENGTH}点偏{'高' if side > 0 else '低'}")
+
+        self.ewma = value if self.ewma is None else EWMA_LAMBDA * value + (1 - EWMA_LAMBDA) * self.ewma
+        if self.n >= MIN_SAMPLES and self.std > 0:
+            low, high = self.ewma_limits()
+            if not low <= self.ewma <= high:
+                alarms.append("EWMA超限")
+
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+        return alarms
+
+    def to_dict(self):
+        """供界面显示的统计值"""
+        low, high = self.limits()
+        return {"n": self.n, "mean": self.mean, "std": self.std, "ewma": self.ewma, "lcl": low, "ucl": high}
+
+
+class SpcTracker:
+    """按 (炉组, 牌号, 字段) 维护运行统计和趋势报警，随入库的记录增量更新
+
+    统计保存在 ResultStore 的 spc_stats 表中，只写入有变化的键。
+    """
+
+    def __init__(self):
+        self.stats = {}  # {(炉组, 牌号, 字段): RunningStats}
+        self.dirty = set()
+        self.alarms = {}  # {炉组: deque[报警]}，报警为 {"炉号", "次数", "牌号", "字段", "值", "规则", "time"}
+
+    @classmethod
+    def from_store(cls, store):
+        """加载保存的统计；没有保存过时按时间顺序从数据库中的结果一次性重建"""
+        tracker = cls()
+        rows = store.load_spc()
+        if rows:
+            for line_id, brand, field, *values in rows:
+                tracker.stats[(line_id, brand, field)] = RunningStats(*values)
+            return tracker
+
+        for chunk in store.iter_query():
+            tracker.update(chunk, collect_alarms=False)
+        tracker.save(store)
+        return tracker
+
+    def update(self, records, collect_alarms=True):
+        """按时间顺序加入新记录 [(炉号, 检测次数, 记录)]，返回新的报警列表"""
+        new_alarms = []
+        for furnace_number, test_number, record in sorted(records, key=lambda item: item[2].get("time") or ""):
+            line_id = lines.line_of(furnace_number)
+            if line_id is None:
+                continue
+            brand = brand_of(record)
+            for field in SPC_FIELDS:
+                value = record.get(field)
+                if value is None:
+                    continue
+                key = (line_id, brand, field)
+                stats = self.stats.get(key)
+                if stats is None:
+                    stats = self.stats[key] = RunningStats()
+                rules = stats.update(value)
+                self.dirty.add(key)
+                if collect_alarms:
+                    for rule in rules:
+                        new_alarms.append({"炉号": furnace_number, "次数": test_number, "牌号": brand, "字段": field,
+                                           "值": value, "规则": rule, "time": record.get("time")})
+        for alarm in new_alarms:
+            self.alarms.setdefault(lines.line_of(alarm["炉号"]), deque(maxlen=RECENT_ALARMS)).append(alarm)
+        return new_alarms
+
+    def rebuild(self, store, keys):
+        """按数据库中的结果重新计算指定的统计键 {(炉组, 牌号, 字段)}
+
+        报告被更正时，被覆盖的旧值已经计入均值、方差、EWMA 和游程（后两者与顺序有关，无法单独扣除），
+        只按时间顺序重新累积受影响的炉组和牌号，其余统计不变；重新计算后没有样本的键从数据库删除。
+        """
+        fresh = SpcTracker()
+        for line_id, brand in {(line_id, brand) for line_id, brand, _ in keys}:
+            # 没有牌号的记录无法按牌号查询，读取整个炉组
+            for chunk in store.iter_query(brand=None if brand == UNKNOWN_BRAND else brand, line=line_id):
+                fresh.update(chunk, collect_alarms=False)
+        removed = []
+        for key in keys:
+            if key in fresh.stats:
+                self.stats[key] = fresh.stats[key]
+                self.dirty.add(key)
+            else:
+                self.stats.pop(key, None)
+                self.dirty.discard(key)
+                removed.append(key)
+        if removed:
+            store.delete_spc(removed)
+
+    def save(self, store):
+        """把有变化的统计写入数据库"""
+        if not self.dirty:
+            return
+        rows = []
+        for key in self.dirty:
+            stats = self.stats[key]
+            rows.append((*key, stats.n, stats.mean, stats.m2, stats.ewma, stats.run_side, stats.run_length))
+        store.save_spc(rows)
+        self.dirty.clear()
+
+    def summary(self):
+        """发布给界面的快照 {炉组号: {"stats": {(牌号, 字段): 统计}, "alarms": [最近的报警]}}"""
+        summary = {}
+        for (line_id, brand, field), stats in self.stats.items():
+            summary.setdefault(line_id, {"stats": {}, "alarms": []})["stats"][(brand, field)] = stats.to_dict()
+        for line_id, alarms in self.alarms.items():
+            summary.setdefault(line_id, {"stats": {}, "alarms": []})["alarms"] = list(alarms)
+        return summary
@@ -0,0 +1,121 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QColor
+
+from brand_specs import specs
+from data_processing import elements
+
+# 表头，与记录字段一一对应
+HEADERS = ["炉号", "次数", *elements, "污泥指数", "时间"]
+# 记录字典中对应的键（炉号、次数不在记录中）
+RECORD_KEYS = [*elements, "污泥指数", "time"]
+# 整行都不着色
+NO_COLORS = (None,) * len(HEADERS)
+# 已创建的 QColor
+QCOLORS = {}
+
+
+def row_colors(brand, record):
+    """按牌号规格一次性判定整行，返回与 HEADERS 对应的颜色元组，不需要着色的列为 None"""
+    flagged = specs.evaluate(brand, record)
+    if not flagged:
+        return NO_COLORS
+    return tuple(
+        qcolor(flagged[header]) if header in flagged else None
+        for header in HEADERS
+    )
+
+
+def qcolor(name):
+    """颜色名转为 QColor，同一颜色只创建一次"""
+    if name not in QCOLORS:
+        QCOLORS[name] = QColor(*specs.colors.get(name, (0, 0, 0)))
+    return QCOLORS[name]
+
+
+class FurnaceTableModel(QAbstractTableModel):
+    """一个炉号的检测记录表格模型，每行以元组保存，刷新时只通知新增或变化的行"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.furnace_id = None
+        self.test_ids = []  # 每行的检测次数
+        self.rows = []  # 每行的值元组，顺序与 HEADERS 相同
+        self.brands = []  # 每行的牌号
+        self.colors = []  # 每行的颜色元组，行数据变化时才重新判定
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            value = self.rows[row][col]
+            return "" if value is None else str(value)
+        if role == Qt.TextAlignmentRole:
+            # 设置表格内容居中显示
+            return Qt.AlignCenter
+        if role == Qt.ForegroundRole:
+            return self.colors[row][col]
+        return None
+
+    def value(self, row, col):
+        """取单元格的原始值（数值不经过字符串转换）"""
+        return self.rows[row][col]
+
+    def set_records(self, furnace_id, records):
+        """更新表格数据，records 为按显示顺序排列的 [(检测次数, 记录)]
+
+        炉号不变且已有的行没有被删除或调换顺序时，只插入新增的行、通知变化的行，
+        保留用户的选中和滚动位置；否则整表重置。
+        """
+        test_ids = [test_id for test_id, _ in records]
+        rows = [(furnace_id, test_id, *[record.get(key) for key in RECORD_KEYS]) for test_id, record in records]
+        brands = [record.get("牌号", "") for _, record in records]
+        old_rows = dict(zip(self.test_ids, zip(self.rows, self.brands, self.colors)))
+        # 未变化的行沿用已判定的颜色
+        colors = [
+            old_rows[test_id][2] if test_id in old_rows and old_rows[test_id][:2] == (row, brand) else row_colors(brand, record)
+            for test_id, row, brand, (_, record) in zip(test_ids, rows, brands, records)
+        ]
+
+        old_ids = set(self.test_ids)
+        kept_ids = [test_id for test_id in test_ids if test_id in old_ids]
+        if furnace_id != self.furnace_id or kept_ids != self.test_ids:
+            self.beginResetModel()
+            self.furnace_id, self.test_ids, self.rows, self.brands, self.colors = furnace_id, test_ids, rows, brands, colors
+            self.endResetModel()
+            return
+
+        for position, test_id in enumerate(test_ids):
+            if test_id not in old_ids:
+                self.beginInsertRows(QModelIndex(), position, position)
+                self.test_ids.insert(position, test_id)
+                self.rows.insert(position, rows[position])
+                self.brands.insert(position, brands[position])
+                self.colors.insert(position, colors[position])
+                self.endInsertRows()
+            elif self.rows[position] != rows[position] or self.brands[position] != brands[position]:
+                self.rows[position] = rows[position]
+                self.brands[position] = brands[position]
+                self.colors[position] = colors[position]
+                self.dataChanged.emit(self.index(position, 0), self.index(position, len(HEADERS) - 1))
+
+    def set_results(self, results):
+        """显示查询结果 [(炉号, 检测次数, 记录)]（可以包含多个炉号），整表重置"""
+        self.beginResetModel()
+        self.furnace_id = None
+        self.test_ids = [(furnace_id, test_id) for furnace_id, test_id, _ in results]
+        self.rows = [(furnace_id, test_id, *[record.get(key) for key in RECORD_KEYS]) for furnace_id, test_id, record in results]
+        self.brands = [record.get("牌号", "") for _, _, record in results]
+        self.colors = [row_colors(brand, record) for brand, (_, _, record) in zip(self.brands, results)]
+        self.endResetModel()
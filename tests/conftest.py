@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 测试直接导入仓库根目录下的模块和 benchmarks 中的报告生成器
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
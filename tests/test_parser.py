@@ -0,0 +1,85 @@
+"""单次扫描的报告解析与原来逐个元素 re.search 的解析结果一致"""
+import random
+import re
+
+import pytest
+
+from data_processing import elements, brands, parse_report, clean_text, extract_elements_from_content
+from generate_reports import render_report, COMPOSITIONS, TESTS_PER_FURNACE
+
+
+def legacy_test_brand(content):
+    """原来的牌号检测（每次调用时编译正则）"""
+    pattern = re.compile(r'\b(' + '|'.join(brands) + r')\b', re.IGNORECASE)
+    match = pattern.search(content)
+    return match.group(1) if match else None
+
+
+def legacy_clean_text(content):
+    """原来的预处理：去掉 "-", "+", "<" 和牌号关键词"""
+    content = re.sub(r'[-+<]', '', content)
+    return re.sub(r'(?i)ADC12Z|AlSi10MnMg', '', content)
+
+
+def legacy_extract_elements(content):
+    """原来的元素提取：每个元素单独 re.search"""
+    element_data = {}
+    for element in elements:
+        match = re.search(rf"{element}\s+([<\d.]+)", content)
+        if match:
+            value = match.group(1)
+            if value == "<":
+                element_data[element] = 0.0
+            else:
+                element_data[element] = round(float(value), 3)
+    return element_data
+
+
+def legacy_parse(content):
+    """原来 read_report 中的解析流程，返回 (牌号, 元素含量)"""
+    a_brand = legacy_test_brand(content)
+    return a_brand, legacy_extract_elements(legacy_clean_text(content))
+
+
+def generated_bodies(count, seed):
+    """生成 count 份报告原文，覆盖各牌号、检测次数和低于检出限的数值"""
+    rng = random.Random(seed)
+    bodies = []
+    for i in range(count):
+        furnace_number = f"{i % 3 + 1}{i:04d}"
+        test_number = rng.choice(TESTS_PER_FURNACE)
+        brand = rng.choice(list(COMPOSITIONS))
+        body = render_report(furnace_number, test_number, brand, rng)
+        if i % 5 == 0:
+            # 牌号写成小写
+            body = body.replace(f"牌号: {brand}", f"牌号: {brand.lower()}")
+        if i % 7 == 0:
+            # 人工写入低于检出限的元素
+            body = re.sub(r"(Sn\s+)[\d.]+", r"\1<0.001", body)
+        if i % 11 == 0:
+            # 缺少某个元素
+            body = re.sub(r"\nNi\s+[^\n]*", "", body)
+        bodies.append(body)
+    return bodies
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_parse_report_matches_legacy_parser(seed):
+    for body in generated_bodies(300, seed):
+        a_brand, element_data, _ = parse_report(body)
+        assert (a_brand, element_data) == legacy_parse(body)
+        assert list(element_data) == [element for element in elements if element in element_data]
+
+
+def test_extract_elements_matches_legacy_parser():
+    for body in generated_bodies(300, 3):
+        cleaned = clean_text(body)
+        assert extract_elements_from_content(cleaned) == legacy_extract_elements(legacy_clean_text(body))
+
+
+def test_parse_report_marks_below_detection():
+    body = render_report("10001", "01", "A380", random.Random(0))
+    body = re.sub(r"(Pb\s+)[\d.]+", r"\1<0.001", body)
+    _, element_data, below_detection = parse_report(body)
+    assert element_data["Pb"] == 0.001
+    assert below_detection == {"Pb"}
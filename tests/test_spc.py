@@ -0,0 +1,36 @@
+"""RunningStats 的增量均值和标准差与 statistics 模块的结果一致"""
+import random
+import statistics
+
+import pytest
+
+from spc import RunningStats
+
+
+@pytest.mark.parametrize("count", [2, 3, 50, 1000])
+def test_running_stats_matches_statistics(count):
+    rng = random.Random(count)
+    values = [rng.uniform(0.5, 1.5) for _ in range(count)]
+    stats = RunningStats()
+    for value in values:
+        stats.update(value)
+    assert stats.n == count
+    assert stats.mean == pytest.approx(statistics.mean(values), rel=1e-12)
+    assert stats.std == pytest.approx(statistics.stdev(values), rel=1e-9)
+
+
+def test_running_stats_few_samples():
+    stats = RunningStats()
+    assert stats.std == 0.0
+    stats.update(1.25)
+    assert stats.mean == 1.25
+    assert stats.std == 0.0
+
+
+def test_running_stats_large_offset():
+    # 数值远离零时 Welford 算法仍然稳定
+    values = [1e6 + v for v in (0.1, 0.2, 0.3, 0.4, 0.5)]
+    stats = RunningStats()
+    for value in values:
+        stats.update(value)
+    assert stats.std == pytest.approx(statistics.stdev(values), rel=1e-6)
@@ -0,0 +1,58 @@
+"""增量同步：报告被更正时写入新值和审计记录，检测时间保持不变"""
+import os
+import random
+
+from data_processing import sync_folder
+from data_store import ResultStore
+from generate_reports import render_report
+
+
+def write_report(folder, filename, content, mtime):
+    path = os.path.join(folder, filename)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.utime(path, (mtime, mtime))
+
+
+def test_sync_folder_corrected_report(tmp_path):
+    folder = str(tmp_path / "reports")
+    os.makedirs(folder)
+    rng = random.Random(0)
+    original = render_report("10001", "01", "ADC12", rng)
+    write_report(folder, "10001-01.txt", original, 1700000000)
+    write_report(folder, "10001-02.txt", render_report("10001", "02", "ADC12", rng), 1700000000)
+
+    store = ResultStore(str(tmp_path / "results.db"))
+    try:
+        manifest = store.load_manifest()
+        updated, replaced = sync_folder(folder, store, manifest)
+        assert sorted(key[:2] for key in updated) == [("10001", "01"), ("10001", "02")]
+        assert replaced == {}
+        before = store.get_furnace("10001")
+
+        # 没有变化的一轮不写入任何结果
+        assert sync_folder(folder, store, manifest) == ([], {})
+
+        # 更正 Fe 的值，文件修改时间变为更正的时间
+        old_fe = before["01"]["Fe"]
+        new_fe = round(old_fe + 0.5, 3)
+        corrected = "".join(f"{'Fe':<8}{new_fe:.4f}\n" if line.startswith("Fe ") else line
+                            for line in original.splitlines(keepends=True))
+        write_report(folder, "10001-01.txt", corrected, 1700003600)
+
+        updated, replaced = sync_folder(folder, store, manifest)
+        assert [key[:2] for key in updated] == [("10001", "01")]
+        assert replaced == {("10001", "01"): before["01"]}
+
+        after = store.get_furnace("10001")
+        assert after["01"]["Fe"] == new_fe
+        assert after["01"]["time"] == before["01"]["time"]
+        assert after["02"] == before["02"]
+
+        history = store.superseded_history("10001")
+        fields = {field: (old_value, new_value) for _, _, field, old_value, new_value in history}
+        assert fields["Fe"] == (old_fe, new_fe)
+        assert "time" not in fields
+        assert {test_number for test_number, *_ in history} == {"01"}
+    finally:
+        store.close()